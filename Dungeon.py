@@ -1,10 +1,34 @@
 import time
 import random
 import os
+import argparse
+import base64
+import binascii
+import hashlib
+import json
+import select
+import sys
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from itertools import accumulate
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
 from rich.console import Console
+from rich.live import Live
 from rich.panel import Panel
 from rich.progress import track
 from rich.prompt import Prompt
+from rich.table import Table
 from rich.text import Text
 
 console = Console()
@@ -13,11 +37,79 @@ console = Console()
 def clear():
     os.system("cls" if os.name == "nt" else "clear")
 
+# ---------- TYPEWRITER ----------
+# animate_text parses the markup once and reveals the styled text in chunks
+# through a single Live region, one refresh per frame. The reveal is paced by
+# a deadline for the whole line (characters * delay * speed), so slow
+# renders shorten the following sleeps instead of stretching the line.
+TEXT_SPEEDS = {"normal": 1.0, "turbo": 0.2, "instant": 0.0}
+TYPE_FPS = 30
+
+class KeyWatch:
+    # Non-blocking "was a key pressed?" check while text is being typed.
+    # Puts a POSIX terminal into cbreak mode for the duration.
+    def __init__(self):
+        self.fd = None
+        self.saved = None
+
+    def __enter__(self):
+        if termios is not None and sys.stdin.isatty():
+            self.fd = sys.stdin.fileno()
+            self.saved = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+        return self
+
+    def __exit__(self, *exc):
+        if self.saved is not None:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+            self.saved = None
+
+    def pressed(self):
+        if msvcrt is not None:
+            hit = False
+            while msvcrt.kbhit():
+                msvcrt.getwch()
+                hit = True
+            return hit
+        if self.saved is None or not select.select([self.fd], [], [], 0)[0]:
+            return False
+        os.read(self.fd, 64)  # Swallow the key (and any escape sequence)
+        return True
+
+class Typewriter:
+    def __init__(self, console, speed=1.0, skippable=True):
+        self.console = console
+        self.speed = speed
+        self.skippable = skippable
+
+    def type(self, text, delay=0.03, style="bold cyan"):
+        rendered = Text.from_markup(text, style=style)
+        total = len(rendered)
+        duration = total * delay * self.speed
+        if duration <= 0 or total == 0 or not self.console.is_terminal:
+            self.console.print(rendered)
+            return
+        frame = 1 / TYPE_FPS
+        start = time.perf_counter()
+        deadline = start + duration
+        shown = 0
+        with Live(rendered[:0], console=self.console, auto_refresh=False) as live, \
+                (KeyWatch() if self.skippable else nullcontext()) as keys:
+            while shown < total:
+                now = time.perf_counter()
+                if now >= deadline or (keys is not None and keys.pressed()):
+                    break
+                target = int(total * (now - start) / duration)
+                if target > shown:
+                    shown = target
+                    live.update(rendered[:shown], refresh=True)
+                time.sleep(min(frame, deadline - now))
+            live.update(rendered, refresh=True)
+
+typewriter = Typewriter(console)
+
 def animate_text(text, delay=0.03, style="bold cyan"):
-    for char in text:
-        console.print(char, end="", style=style)
-        time.sleep(delay)
-    console.print("")
+    typewriter.type(text, delay, style)
 
 def loading_animation(task_text="Loading...", duration=1.5):
     for _ in track(range(20), description=task_text):
@@ -39,26 +131,13 @@ class Player:
     def show_status(self):
         animate_text(f"[yellow]HP: {self.hp}/{self.max_hp} | Gold: {self.gold} | Inventory: {self.inventory}[/yellow]", delay=0.005)
 
-    def use_item(self):
+    def choose_item(self):
+        # Asks which item to use in battle; None when there is nothing to use
         if not self.inventory:
             animate_text("[red]Your inventory is empty![/red]")
-            return False
+            return None
         animate_text("[blue]What item would you like to use? (e.g., potion)[/blue]")
-        item = Prompt.ask("Item").lower().strip()
-        if item in self.inventory and self.inventory[item] > 0:
-            if item == "potion":
-                heal_amount = random.randint(20, 35)
-                self.hp = min(self.max_hp, self.hp + heal_amount)
-                animate_text(f"[green]You drank a potion and healed {heal_amount} HP![/green]")
-            elif item == "shield":
-                animate_text("[green]You brace yourself with a shield. Incoming damage will be reduced this turn![/green]")
-            self.inventory[item] -= 1
-            if self.inventory[item] == 0:
-                del self.inventory[item]
-            return item
-        else:
-            animate_text("[red]You don't have that item![/red]")
-            return False
+        return Prompt.ask("Item").lower().strip()
 
 class Enemy:
     def __init__(self, name, hp, attack_power, gold_reward):
@@ -70,42 +149,240 @@ class Enemy:
     def is_alive(self):
         return self.hp > 0
 
+# ---------- COMBAT ENGINE ----------
+# The rules of a fight without prompts, text or pauses, shared by battle()
+# and the balance simulator. rng is the random module or a random.Random.
+SHIELD_BLOCK = 10      # Damage absorbed by defending or raising a shield
+POTION_HEAL = (20, 35)
+ENEMY_TYPES = {
+    # name: (hp range, attack range, gold range)
+    "Goblin": ((25, 35), (10, 15), (10, 20)),
+    "Skeleton": ((30, 40), (12, 18), (15, 25)),
+    "Dark Knight": ((35, 50), (15, 20), (20, 30)),
+}
+BOSS = ("Dungeon Golem", 80, 25, 100)
+
+def roll_enemy(name, rng=random):
+    hp, attack, gold = ENEMY_TYPES[name]
+    return Enemy(name, rng.randint(*hp), rng.randint(*attack), rng.randint(*gold))
+
+def random_enemy(rng=random):
+    return roll_enemy(rng.choice(list(ENEMY_TYPES)), rng)
+
+def make_boss(rng=random):
+    return Enemy(*BOSS)
+
+def combat_round(player, enemy, action, shield_active, rng=random, log=None):
+    # One round: the player's action ("attack", "defend", an item name or
+    # None to do nothing), then the enemy's reply if it is still standing.
+    # Returns the new shield state; what happened is appended to log as
+    # (kind, amount) pairs when a list is given.
+    if action == "attack":
+        damage = rng.randint(player.attack_power - 5, player.attack_power + 5)
+        enemy.hp -= damage
+        if log is not None:
+            log.append(("attack", damage))
+    elif action == "defend":
+        shield_active = True
+        if log is not None:
+            log.append(("defend", 0))
+    elif action is not None:
+        if action in ("potion", "shield") and player.inventory.get(action, 0) > 0:
+            player.inventory[action] -= 1
+            if player.inventory[action] == 0:
+                del player.inventory[action]
+            if action == "potion":
+                heal_amount = rng.randint(*POTION_HEAL)
+                player.hp = min(player.max_hp, player.hp + heal_amount)
+                if log is not None:
+                    log.append(("potion", heal_amount))
+            else:
+                shield_active = True
+                if log is not None:
+                    log.append(("shield", 0))
+        elif log is not None:
+            log.append(("missing", 0))
+
+    if enemy.is_alive():
+        enemy_damage = rng.randint(enemy.attack_power - 3, enemy.attack_power + 3)
+        if shield_active:
+            enemy_damage = max(0, enemy_damage - SHIELD_BLOCK)
+            if log is not None:
+                log.append(("blocked", 0))
+        player.hp -= enemy_damage
+        if log is not None:
+            log.append(("enemy", enemy_damage))
+        shield_active = False  # Reset shield effect
+    return shield_active
+
+# ---------- COMBAT ADVISOR ----------
+# Exact win chances for each choice in a fight, by expectimax over the damage
+# rolls in combat_round. When the player chooses, the shield is always down
+# (the enemy's reply clears it), and a shield item is never better than
+# defending for free. A position is therefore (player hp, enemy hp, potions).
+#
+# Values for one (player attack, enemy attack, max hp, potions) combination
+# form a layer, built bottom-up one enemy-hp row at a time. A row only needs
+# lower rows of its own layer and the layer with one potion fewer. Each row
+# also stores its post-decision values ("after": win chance once the enemy is
+# about to reply), so every expectation is a window sum over a prefix array.
+# Defending can leave the position unchanged. When it is the best choice, its
+# value solves V = rest + p0 * V, i.e. V = rest / (1 - p0).
+# Layers are kept in an LRU shared by every fight and grow as stronger
+# enemies need more rows.
+ADVISOR_LAYERS = 64
+
+class AdvisorLayer:
+    def __init__(self):
+        self.values = [None]  # values[e][p]: win chance with the player to act
+        self.after = [None]   # after[e][p]: win chance with the enemy to reply
+        self.hits = None      # Sum of the after rows an attack from the next row can reach
+
+class CombatAdvisor:
+    def __init__(self, max_layers=ADVISOR_LAYERS):
+        self.layers = OrderedDict()
+        self.max_layers = max_layers
+
+    def layer(self, player_attack, enemy_attack, max_hp, potions, enemy_hp):
+        # Layer with rows up to enemy_hp, building whatever is missing
+        key = ((player_attack << 10 | enemy_attack) << 12 | max_hp) << 8 | potions
+        layer = self.layers.get(key)
+        if layer is None:
+            layer = AdvisorLayer()
+            self.layers[key] = layer
+            if len(self.layers) > self.max_layers:
+                self.layers.popitem(last=False)
+        else:
+            self.layers.move_to_end(key)
+        if len(layer.values) <= enemy_hp:
+            lower = None
+            if potions:
+                lower = self.layer(player_attack, enemy_attack, max_hp, potions - 1, enemy_hp)
+            self.extend(layer, lower, player_attack, enemy_attack, max_hp, enemy_hp)
+        return layer
+
+    def extend(self, layer, lower, player_attack, enemy_attack, max_hp, enemy_hp):
+        hits = range(player_attack - 5, player_attack + 6)
+        low, high = enemy_attack - 3, enemy_attack + 3
+        replies = high - low + 1
+        # Guarded hits that get through deal guard_low..guard_high, one roll each
+        guard_low, guard_high = max(1, low - SHIELD_BLOCK), high - SHIELD_BLOCK
+        stall = 1 - max(0, guard_high - guard_low + 1) / replies
+        # Defending when every guarded hit is blocked never ends the fight
+        defend_scale = 1 / (replies * (1 - stall)) if stall < 1 else 0.0
+        heal_low, heal_high = POTION_HEAL
+        heals = heal_high - heal_low + 1
+        won = [1.0] * (max_hp + 1)
+        if layer.hits is None:
+            layer.hits = [float(len(hits))] * (max_hp + 1)  # Row 1: every hit wins
+
+        for e in range(len(layer.values), enemy_hp + 1):
+            attack = [total / len(hits) for total in layer.hits]
+            potion = None
+            if lower is not None:
+                # Healing past max_hp is capped, so pad with the full-HP value
+                padded = lower.after[e] + [lower.after[e][max_hp]] * heal_high
+                prefix = list(accumulate(padded, initial=0.0))
+                potion = [(prefix[p + heal_high + 1] - prefix[p + heal_low]) / heals
+                          for p in range(max_hp + 1)]
+
+            row = [0.0] * (max_hp + 1)
+            sums = [0.0] * (max_hp + 2)  # sums[q] = row[0] + ... + row[q - 1]
+            for p in range(1, max_hp + 1):
+                best = attack[p]
+                if potion is not None and potion[p] > best:
+                    best = potion[p]
+                if defend_scale and p > guard_low:
+                    defend = (sums[p - guard_low + 1] - sums[p - guard_high if p > guard_high else 0]) * defend_scale
+                    if defend > best:
+                        best = defend
+                row[p] = best
+                sums[p + 1] = sums[p] + best
+
+            # after[p] = mean of row[p - damage] over the enemy's rolls (0 once dead)
+            prefix = list(accumulate([0.0] * (high + 1) + row, initial=0.0))
+            after = [(prefix[p - low + high + 2] - prefix[p + 1]) / replies for p in range(max_hp + 1)]
+            after[0] = 0.0
+            layer.values.append(row)
+            layer.after.append(after)
+            # Slide the attack window: the next row's hits land on rows
+            # e + 1 - hits[-1] .. e + 1 - hits[0]
+            leaving = e - hits[-1]
+            leaving = layer.after[leaving] if leaving > 0 else won
+            entering = e + 1 - hits[0]
+            entering = layer.after[entering] if entering > 0 else won
+            layer.hits = [total + new - old for total, new, old in zip(layer.hits, entering, leaving)]
+
+    def advise(self, player, enemy):
+        # Returns (best action, {action: win chance}), or None when some roll
+        # could do no damage (the rows would then depend on themselves)
+        player_attack, enemy_attack, max_hp = player.attack_power, enemy.attack_power, player.max_hp
+        if player_attack - 5 < 1 or enemy_attack - 3 < 0 or player.hp <= 0 or enemy.hp <= 0:
+            return None
+        potions = min(player.inventory.get("potion", 0), 255)
+        p, e = min(player.hp, max_hp), enemy.hp
+        layer = self.layer(player_attack, enemy_attack, max_hp, potions, e)
+
+        chances = {}
+        hits = range(player_attack - 5, player_attack + 6)
+        chances["attack"] = sum(layer.after[e - hit][p] if e > hit else 1.0 for hit in hits) / len(hits)
+        replies = [max(0, damage - SHIELD_BLOCK) for damage in range(enemy_attack - 3, enemy_attack + 4)]
+        stall = replies.count(0) / len(replies)
+        rest = sum(layer.values[e][p - damage] for damage in replies if 0 < damage < p) / len(replies)
+        chances["defend"] = rest / (1 - stall) if stall < 1 else 0.0
+        if potions:
+            lower = self.layer(player_attack, enemy_attack, max_hp, potions - 1, e)
+            heal_low, heal_high = POTION_HEAL
+            chances["potion"] = sum(lower.after[e][min(max_hp, p + heal)]
+                                    for heal in range(heal_low, heal_high + 1)) / (heal_high - heal_low + 1)
+        return max(chances, key=chances.get), chances
+
+advisor = CombatAdvisor()
+show_hints = False
+
 # ---------- COMBAT SYSTEM ----------
 def battle(player, enemy):
     animate_text(f"\n[bold red]A wild {enemy.name} appears![/bold red]")
+    if show_hints:
+        advisor.advise(player, enemy)  # Build the tables before the loading bar
     loading_animation(f"Engaging {enemy.name}...", 1)
     shield_active = False
 
     while enemy.is_alive() and player.hp > 0:
         animate_text(f"\nYour HP: {player.hp} | {enemy.name} HP: {enemy.hp}")
-        animate_text("Choose your action: [attack] | [defend] | [item]")
+        if show_hints:
+            advice = advisor.advise(player, enemy)
+            if advice is not None:
+                best, chances = advice
+                names = {"attack": "attack", "defend": "defend", "potion": "item (potion)"}
+                others = ", ".join(f"{names[action]} {chance:.0%}" for action, chance in chances.items() if action != best)
+                animate_text(f"[dim]Hint: {names[best]} ({chances[best]:.0%} to win; {others})[/dim]", delay=0.005)
+        animate_text("Choose your action: \\[attack] | \\[defend] | \\[item]")
         action = Prompt.ask("Action").lower().strip()
         
-        if action == "attack":
-            # Player attacks enemy
-            damage = random.randint(player.attack_power - 5, player.attack_power + 5)
-            enemy.hp -= damage
-            animate_text(f"[green]You attack {enemy.name} for {damage} damage![/green]")
-        elif action == "defend":
-            shield_active = True
-            animate_text("[blue]You brace for the next attack, reducing incoming damage![/blue]")
-        elif action == "item":
-            used_item = player.use_item()
-            if used_item == "shield":
-                shield_active = True
-        else:
+        if action == "item":
+            action = player.choose_item()
+        elif action not in ("attack", "defend"):
             animate_text("[red]Invalid action![/red]")
             continue
 
-        # Enemy turn (if still alive)
-        if enemy.is_alive():
-            enemy_damage = random.randint(enemy.attack_power - 3, enemy.attack_power + 3)
-            if shield_active:
-                enemy_damage = max(0, enemy_damage - 10)
-                animate_text(f"[blue]Your defense reduced the damage![/blue]")
-            player.hp -= enemy_damage
-            animate_text(f"[red]{enemy.name} attacks you for {enemy_damage} damage![/red]")
-            shield_active = False  # Reset shield effect
+        log = []
+        shield_active = combat_round(player, enemy, action, shield_active, log=log)
+        for kind, amount in log:
+            if kind == "attack":
+                animate_text(f"[green]You attack {enemy.name} for {amount} damage![/green]")
+            elif kind == "defend":
+                animate_text("[blue]You brace for the next attack, reducing incoming damage![/blue]")
+            elif kind == "potion":
+                animate_text(f"[green]You drank a potion and healed {amount} HP![/green]")
+            elif kind == "shield":
+                animate_text("[green]You brace yourself with a shield. Incoming damage will be reduced this turn![/green]")
+            elif kind == "missing":
+                animate_text("[red]You don't have that item![/red]")
+            elif kind == "blocked":
+                animate_text("[blue]Your defense reduced the damage![/blue]")
+            elif kind == "enemy":
+                animate_text(f"[red]{enemy.name} attacks you for {amount} damage![/red]")
 
         time.sleep(0.8)
 
@@ -118,12 +395,142 @@ def battle(player, enemy):
         animate_text(f"[yellow]You found {enemy.gold_reward} gold. Total Gold: {player.gold}[/yellow]")
         time.sleep(1)
 
-# ---------- ROOM DEFINITIONS & EVENTS ----------
-# Each room is a dictionary with keys:
-# - description: text to show
-# - options: dict of possible next room keys (or special commands)
-# - event: a function to call when entering (optional)
+# ---------- BALANCE SIMULATOR ----------
+# Plays fights headless with a policy standing in for the player, so enemy
+# stats can be tuned from win rates instead of play sessions. A policy is
+# called with (player, enemy) before each round and returns an action for
+# combat_round; policies are small classes so they can be sent to worker
+# processes. Fights are split into batches, each with its own seeded RNG, so
+# results do not depend on the number of workers.
+MAX_ROUNDS = 100   # Fights still going after this many rounds count as losses
+SIM_BATCH = 20000  # Fights per worker task
+
+class AlwaysAttack:
+    name = "attack"
+
+    def __call__(self, player, enemy):
+        return "attack"
+
+class DefendBelow:
+    # Defends at or below the HP threshold unless one hit is sure to finish the enemy
+    def __init__(self, threshold=30):
+        self.threshold = threshold
+        self.name = f"defend:{threshold}"
+
+    def __call__(self, player, enemy):
+        if player.hp <= self.threshold and enemy.hp > player.attack_power - 5:
+            return "defend"
+        return "attack"
+
+class PotionBelow:
+    # Drinks a potion at or below the HP threshold (raising the shield once
+    # out of potions) unless one hit is sure to finish the enemy
+    def __init__(self, threshold=40):
+        self.threshold = threshold
+        self.name = f"potion:{threshold}"
+
+    def __call__(self, player, enemy):
+        if player.hp <= self.threshold and enemy.hp > player.attack_power - 5:
+            if "potion" in player.inventory:
+                return "potion"
+            if "shield" in player.inventory:
+                return "shield"
+        return "attack"
+
+class BestPlay:
+    # Follows the combat advisor; each worker process keeps its own tables
+    name = "best"
 
+    def __call__(self, player, enemy):
+        advice = advisor.advise(player, enemy)
+        return advice[0] if advice is not None else "attack"
+
+POLICIES = {"attack": AlwaysAttack, "defend": DefendBelow, "potion": PotionBelow, "best": BestPlay}
+
+ENCOUNTERS = {name: partial(roll_enemy, name) for name in ENEMY_TYPES}
+ENCOUNTERS["enemy room"] = random_enemy
+ENCOUNTERS["boss room"] = make_boss
+
+def parse_policy(spec):
+    # "attack", "best", "defend", "defend:25", "potion:50"
+    name, _, threshold = spec.partition(":")
+    if name not in POLICIES:
+        raise argparse.ArgumentTypeError(f"unknown policy {name!r} (choose from {', '.join(POLICIES)})")
+    if not threshold:
+        return POLICIES[name]()
+    if name in ("attack", "best") or not threshold.isdigit():
+        raise argparse.ArgumentTypeError(f"bad policy {spec!r}")
+    return POLICIES[name](int(threshold))
+
+def simulate_batch(task):
+    encounter, policy, fights, seed, hp = task
+    rng = random.Random(seed)
+    spawn = ENCOUNTERS[encounter]
+    wins = hp_lost = gold = rounds = potions = 0
+    for _ in range(fights):
+        player = Player()
+        player.hp = hp
+        enemy = spawn(rng)
+        shield_active = False
+        fight_rounds = 0
+        while player.hp > 0 and enemy.is_alive() and fight_rounds < MAX_ROUNDS:
+            shield_active = combat_round(player, enemy, policy(player, enemy), shield_active, rng)
+            fight_rounds += 1
+        if player.hp > 0 and not enemy.is_alive():
+            wins += 1
+            gold += enemy.gold_reward
+        hp_lost += hp - max(player.hp, 0)
+        rounds += fight_rounds
+        potions += 2 - player.inventory.get("potion", 0)
+    return wins, hp_lost, gold, rounds, potions
+
+def simulate(encounters, policies, fights, workers=None, seed=0, hp=100):
+    # Returns {(encounter, policy name): (wins, hp lost, gold, rounds, potions)} summed over fights
+    tasks = []
+    for encounter in encounters:
+        for policy in policies:
+            for batch, first in enumerate(range(0, fights, SIM_BATCH)):
+                # Same seeds for every policy, so they face the same enemies
+                tasks.append((encounter, policy, min(SIM_BATCH, fights - first),
+                              f"{seed}:{encounter}:{batch}", hp))
+    if workers == 1:
+        results = list(map(simulate_batch, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_batch, tasks))
+    totals = {}
+    for (encounter, policy, *_), result in zip(tasks, results):
+        key = (encounter, policy.name)
+        totals[key] = tuple(map(sum, zip(totals.get(key, (0,) * 5), result)))
+    return totals
+
+def print_simulation(encounters, policies, fights, workers=None, seed=0, hp=100):
+    start = time.perf_counter()
+    totals = simulate(encounters, policies, fights, workers, seed, hp)
+    elapsed = time.perf_counter() - start
+    table = Table(title=f"{fights} fights per row, starting HP {hp}")
+    for column in ("Encounter", "Policy", "Win %", "HP lost", "Gold/room", "Rounds", "Potions"):
+        table.add_column(column, justify="left" if column in ("Encounter", "Policy") else "right")
+    for (encounter, policy), (wins, hp_lost, gold, rounds, potions) in totals.items():
+        table.add_row(encounter, policy, f"{100 * wins / fights:.1f}", f"{hp_lost / fights:.1f}",
+                      f"{gold / fights:.1f}", f"{rounds / fights:.2f}", f"{potions / fights:.2f}")
+    console.print(table)
+    total = fights * len(totals)
+    console.print(f"{total} fights in {elapsed:.2f}s ({total / elapsed:,.0f} fights/s)")
+
+# ---------- EVENTS ----------
+# Room events are registered by name; dungeon files refer to them by that
+# name. An event gets the player, and returning False sends the player back
+# to the start room.
+EVENTS = {}
+
+def event(name):
+    def register(func):
+        EVENTS[name] = func
+        return func
+    return register
+
+@event("trap")
 def event_trap(player):
     animate_text("[red]You triggered a hidden trap! Spikes pierce the floor...[/red]")
     damage = random.randint(15, 30)
@@ -131,12 +538,14 @@ def event_trap(player):
     animate_text(f"[red]You take {damage} damage![/red]")
     time.sleep(0.8)
 
+@event("healing")
 def event_healing(player):
     heal_amount = random.randint(15, 25)
     player.hp = min(player.max_hp, player.hp + heal_amount)
     animate_text(f"[green]A mystical aura heals you for {heal_amount} HP![/green]")
     time.sleep(0.8)
 
+@event("puzzle")
 def event_puzzle(player):
     animate_text("[blue]A mystical door asks you a riddle:[/blue]")
     animate_text('"I have keys but no locks, space but no rooms. You can enter, but can’t go outside. What am I?"')
@@ -148,6 +557,7 @@ def event_puzzle(player):
         return False
     return True
 
+@event("treasure")
 def event_treasure(player):
     gold_found = random.randint(20, 50)
     animate_text(f"[yellow]You find a hidden stash and collect {gold_found} gold![/yellow]")
@@ -159,77 +569,346 @@ def event_treasure(player):
         player.inventory[item] = player.inventory.get(item, 0) + 1
     time.sleep(0.8)
 
+@event("enemy")
 def event_enemy(player):
-    enemy_types = [
-        {"name": "Goblin", "hp": random.randint(25, 35), "attack": random.randint(10, 15), "gold": random.randint(10, 20)},
-        {"name": "Skeleton", "hp": random.randint(30, 40), "attack": random.randint(12, 18), "gold": random.randint(15, 25)},
-        {"name": "Dark Knight", "hp": random.randint(35, 50), "attack": random.randint(15, 20), "gold": random.randint(20, 30)}
-    ]
-    enemy_choice = random.choice(enemy_types)
-    enemy = Enemy(enemy_choice["name"], enemy_choice["hp"], enemy_choice["attack"], enemy_choice["gold"])
+    enemy = random_enemy()
     battle(player, enemy)
 
-# Define a larger dungeon map with branching paths and events.
-rooms = {
-    "start": {
-        "description": "You awaken in a dim dungeon corridor. Flickering torches reveal two passageways.",
-        "options": {"left": "trap_room", "right": "puzzle_room"}
-    },
-    "trap_room": {
-        "description": "The corridor narrows. You feel a sense of dread as you proceed.",
-        "event": event_trap,
-        "options": {"forward": "treasure_room", "back": "start"}
-    },
-    "puzzle_room": {
-        "description": "An ancient door with cryptic runes blocks your way.",
-        "event": event_puzzle,
-        "options": {"open": "enemy_room", "back": "start"}
-    },
-    "treasure_room": {
-        "description": "A hidden chamber glitters with promise.",
-        "event": event_treasure,
-        "options": {"forward": "enemy_room", "back": "trap_room"}
-    },
-    "enemy_room": {
-        "description": "A dark hall resonates with ominous sounds. Danger lurks around every corner.",
-        "event": event_enemy,
-        "options": {"forward": "boss_room", "back": "treasure_room"}
-    },
-    "boss_room": {
-        "description": "You enter a vast cavern where the Dungeon Boss awaits—a towering, infernal golem!",
-        "event": lambda player: battle(player, Enemy("Dungeon Golem", 80, 25, 100)),
-        "options": {"escape": "exit", "back": "enemy_room"}
-    },
-    "exit": {
-        "description": "A blinding light appears ahead. Freedom is within your grasp.",
-        "options": {}
-    }
+@event("boss")
+def event_boss(player):
+    battle(player, make_boss())
+
+# ---------- DUNGEON FILES ----------
+# A dungeon is a JSON file:
+#   {"start": "<room>", "exit": "<room>",
+#    "rooms": {"<room>": {"description": "...", "event": "<event name>",
+#                         "options": {"<choice>": "<room>", ...}}, ...}}
+# "event" is optional. Loading checks that every option leads to a room,
+# every event is registered and the exit can be reached from the start,
+# then compiles the rooms into a RoomGraph. The compiled graph is cached as
+# plain JSON in __pycache__ next to the file, under the hash of the file's
+# contents, so a large campaign is only checked once. The cache is data
+# only and is checked for consistency on load, so a tampered cache file
+# cannot run code.
+DEFAULT_DUNGEON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dungeon.json")
+GRAPH_FORMAT = 2  # Bump whenever the cached layout changes
+
+class RoomGraph:
+    # Rooms are numbered 0..n-1 in file order. The choices out of room r are
+    # labels[offsets[r]:offsets[r + 1]], leading to the matching targets.
+    # exit_distance[r] is the fewest moves from r to the exit, -1 if the
+    # exit cannot be reached from r.
+    def __init__(self, names, descriptions, events, offsets, targets, labels, start, exit, exit_distance):
+        self.names = names
+        self.descriptions = descriptions
+        self.events = events
+        self.offsets = offsets
+        self.targets = targets
+        self.labels = labels
+        self.start = start
+        self.exit = exit
+        self.exit_distance = exit_distance
+        self.ids = {name: room for room, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def to_cache(self):
+        # JSON-ready; the arrays are stored as base64 of their raw bytes
+        return {
+            "format": GRAPH_FORMAT, "byteorder": sys.byteorder,
+            "names": self.names, "descriptions": self.descriptions, "events": self.events,
+            "labels": self.labels, "start": self.start, "exit": self.exit,
+            "offsets": base64.b64encode(self.offsets.tobytes()).decode("ascii"),
+            "targets": base64.b64encode(self.targets.tobytes()).decode("ascii"),
+            "exit_distance": base64.b64encode(self.exit_distance.tobytes()).decode("ascii"),
+        }
+
+    def describe(self, room):
+        return self.names[room], self.descriptions[room], self.events[room]
+
+    def retreat(self, room):
+        # Where a failed puzzle sends the player
+        return self.start
+
+    def options(self, room):
+        # (choice, target room) pairs in file order
+        begin, end = self.offsets[room], self.offsets[room + 1]
+        return list(zip(self.labels[begin:end], self.targets[begin:end]))
+
+    def option(self, room, choice):
+        for label, target in self.options(room):
+            if label == choice:
+                return target
+        return None
+
+    def reaches_exit(self, room):
+        return self.exit_distance[room] >= 0
+
+def compile_dungeon(data):
+    rooms = data.get("rooms")
+    if not isinstance(rooms, dict) or not rooms:
+        raise ValueError("dungeon has no rooms")
+    names = list(rooms)
+    ids = {name: room for room, name in enumerate(names)}
+    start_name = data.get("start", "start")
+    exit_name = data.get("exit", "exit")
+    for role, name in (("start", start_name), ("exit", exit_name)):
+        if name not in ids:
+            raise ValueError(f"{role} room {name!r} is not defined")
+
+    descriptions = []
+    events = []
+    offsets = array("I", [0])
+    targets = array("I")
+    labels = []
+    dangling = []
+    for name in names:
+        room = rooms[name]
+        descriptions.append(room.get("description", ""))
+        event_name = room.get("event")
+        if event_name is not None and event_name not in EVENTS:
+            raise ValueError(f"room {name!r} uses unknown event {event_name!r}")
+        events.append(event_name)
+        for choice, target in room.get("options", {}).items():
+            if target not in ids:
+                dangling.append(f"{name}.{choice} -> {target}")
+                continue
+            labels.append(choice)
+            targets.append(ids[target])
+        offsets.append(len(targets))
+    if dangling:
+        shown = ", ".join(dangling[:10])
+        more = f" (and {len(dangling) - 10} more)" if len(dangling) > 10 else ""
+        raise ValueError(f"options lead to undefined rooms: {shown}{more}")
+
+    # Breadth-first search back from the exit over reversed edges
+    incoming = [[] for _ in names]
+    for room in range(len(names)):
+        for target in targets[offsets[room]:offsets[room + 1]]:
+            incoming[target].append(room)
+    exit_room = ids[exit_name]
+    exit_distance = array("i", [-1]) * len(names)
+    exit_distance[exit_room] = 0
+    queue = deque([exit_room])
+    while queue:
+        room = queue.popleft()
+        for source in incoming[room]:
+            if exit_distance[source] < 0:
+                exit_distance[source] = exit_distance[room] + 1
+                queue.append(source)
+    if exit_distance[ids[start_name]] < 0:
+        raise ValueError(f"exit room {exit_name!r} cannot be reached from {start_name!r}")
+
+    return RoomGraph(names, descriptions, events, offsets, targets, labels,
+                     ids[start_name], exit_room, exit_distance)
+
+def graph_from_cache(data):
+    # Rebuilds a RoomGraph from to_cache() data, or None if it does not fit
+    if not isinstance(data, dict) or data.get("format") != GRAPH_FORMAT:
+        return None
+    arrays = {}
+    for field, typecode in (("offsets", "I"), ("targets", "I"), ("exit_distance", "i")):
+        arrays[field] = array(typecode, base64.b64decode(data[field], validate=True))
+        if data["byteorder"] != sys.byteorder:
+            arrays[field].byteswap()
+    names = data["names"]
+    graph = RoomGraph(names, data["descriptions"], data["events"], arrays["offsets"], arrays["targets"],
+                      data["labels"], data["start"], data["exit"], arrays["exit_distance"])
+    rooms = len(names)
+    if (len(graph.descriptions) != rooms or len(graph.events) != rooms
+            or len(graph.offsets) != rooms + 1 or len(graph.exit_distance) != rooms
+            or len(graph.targets) != len(graph.labels) or graph.offsets[-1] != len(graph.targets)
+            or not 0 <= graph.start < rooms or not 0 <= graph.exit < rooms
+            or (graph.targets and max(graph.targets) >= rooms)):
+        return None
+    # Events may have been renamed since the cache was written
+    if not set(graph.events) - {None} <= EVENTS.keys():
+        return None
+    return graph
+
+def load_dungeon(path=DEFAULT_DUNGEON, use_cache=True):
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()[:16]
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "__pycache__")
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.graph.json")
+    if use_cache:
+        try:
+            with open(cache_path, "rb") as f:
+                graph = graph_from_cache(json.load(f))
+            if graph is not None:
+                return graph
+        except (OSError, ValueError, TypeError, KeyError, binascii.Error):
+            pass  # Missing or unreadable cache: compile again
+
+    graph = compile_dungeon(json.loads(raw))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(graph.to_cache(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # A read-only install just compiles every time
+    return graph
+
+# ---------- PROCEDURAL DUNGEONS ----------
+# A generated dungeon is a spine of rooms from start to exit, and each spine
+# room may have a side branch of up to BRANCH_LENGTH rooms. Room ids are
+# fixed slots: spine room i is id i, and step j of its branch is
+# spine + i * BRANCH_LENGTH + j. Every room can therefore be rebuilt on its
+# own from (seed, id), and rooms are only materialized when first needed.
+# Some branches end in a passage further along the spine, but never past
+# the boss guarding the exit. The spine always leads to the exit. Event odds
+# shift from treasure and healing near the start to enemies and traps
+# deeper in, by graph distance.
+BRANCH_LENGTH = 4
+SHORTCUT_CHANCE = 0.3
+ROOM_EVENTS = {
+    # event: (weight at the start, weight next to the exit)
+    None: (4, 1),
+    "treasure": (3, 1),
+    "healing": (3, 1),
+    "puzzle": (1, 1),
+    "trap": (1, 3),
+    "enemy": (1, 5),
+}
+ROOM_KINDS = ["hall", "crypt", "cellar", "gallery", "vault", "chamber", "cistern", "shrine"]
+ROOM_SIGHTS = {
+    None: ["Dust lies undisturbed on the floor.", "Water drips somewhere in the dark.",
+           "Faded banners hang from the walls."],
+    "treasure": ["Something glints between the stones.", "A toppled chest lies in the corner."],
+    "healing": ["A soft blue light pulses from a fountain.", "The air here smells of herbs."],
+    "puzzle": ["Runes cover a sealed door.", "A stone face watches you from the wall."],
+    "trap": ["The floor tiles are suspiciously clean.", "Thin slits line the walls."],
+    "enemy": ["You hear breathing that is not your own.", "Fresh claw marks score the floor."],
+    "boss": ["The ground shakes with heavy footsteps. The exit is close."],
 }
 
+class ProceduralDungeon:
+    # Same interface as RoomGraph: start, exit, describe, options, option, retreat
+    def __init__(self, rooms=2000, seed=0):
+        self.seed = seed
+        # Branches average half of BRANCH_LENGTH rooms
+        self.spine = max(3, round(rooms / (1 + BRANCH_LENGTH / 2)))
+        self.start = 0
+        self.exit = self.spine - 1
+        self.rooms = {}  # id -> (name, description, event, options), filled on demand
+
+    def __len__(self):
+        return self.spine * (BRANCH_LENGTH + 1)  # Room slots, some are never used
+
+    def rng(self, *key):
+        return random.Random(f"{self.seed}:" + ":".join(map(str, key)))
+
+    def branch(self, spine_room):
+        # (length, spine room the last branch room leads to or None)
+        if spine_room in (self.start, self.exit, self.exit - 1):
+            return 0, None
+        rng = self.rng("branch", spine_room)
+        length = rng.randint(0, BRANCH_LENGTH)
+        shortcut = None
+        if length and rng.random() < SHORTCUT_CHANCE:
+            shortcut = min(self.exit - 1, spine_room + rng.randint(2, 2 + length))
+        return length, shortcut
+
+    def locate(self, room):
+        # (spine room, step along its branch or -1 on the spine)
+        if room < self.spine:
+            return room, -1
+        offset = room - self.spine
+        return offset // BRANCH_LENGTH, offset % BRANCH_LENGTH
+
+    def distance(self, room):
+        spine_room, step = self.locate(room)
+        return spine_room + step + 1
+
+    def retreat(self, room):
+        # Where a failed puzzle sends the player: one room back
+        spine_room, step = self.locate(room)
+        if step < 0:
+            return max(self.start, room - 1)
+        return room - 1 if step else spine_room
+
+    def describe(self, room):
+        return self.materialize(room)[:3]
+
+    def options(self, room):
+        return self.materialize(room)[3]
+
+    def option(self, room, choice):
+        for label, target in self.options(room):
+            if label == choice:
+                return target
+        return None
+
+    def materialize(self, room):
+        cached = self.rooms.get(room)
+        if cached is not None:
+            return cached
+        spine_room, step = self.locate(room)
+        rng = self.rng("room", room)
+        distance = self.distance(room)
+        options = []
+        if step < 0:
+            if room != self.exit:
+                options.append(("forward", room + 1))
+            if room != self.start:
+                options.append(("back", room - 1))
+            if self.branch(room)[0]:
+                options.append(("side passage", self.spine + room * BRANCH_LENGTH))
+        else:
+            length, shortcut = self.branch(spine_room)
+            if step + 1 < length:
+                options.append(("forward", room + 1))
+            elif shortcut is not None:
+                options.append(("climb", shortcut))
+            options.append(("back", room - 1 if step else spine_room))
+
+        if room == self.start:
+            name, event_name = "start", None
+            description = "You awaken in a vast, dark dungeon. Somewhere far ahead lies the way out."
+        elif room == self.exit:
+            name, event_name = "exit", None
+            description = "You see daylight! Freedom is near."
+        else:
+            if room == self.exit - 1:
+                event_name = "boss"
+            else:
+                depth = min(1.0, distance / self.exit)
+                weights = [near + (far - near) * depth for near, far in ROOM_EVENTS.values()]
+                event_name = rng.choices(list(ROOM_EVENTS), weights)[0]
+            name = f"{rng.choice(ROOM_KINDS)} at depth {distance}"
+            description = rng.choice(ROOM_SIGHTS[event_name])
+        materialized = (name, description, event_name, options)
+        self.rooms[room] = materialized
+        return materialized
+
 # ---------- GAME LOOP ----------
-def play_game():
+def play_game(graph):
     player = Player()
-    current_room = "start"
+    room = graph.start
     animate_text("Welcome, brave adventurer, to [bold yellow]The Ultimate Dungeon Escape[/bold yellow]!")
     time.sleep(1)
     
     while True:
         clear()
         player.show_status()
-        room = rooms[current_room]
-        panel = Panel(Text(room["description"], justify="center"), title=f"[bold magenta]{current_room.upper()}[/bold magenta]", border_style="bright_blue")
+        name, description, event_name = graph.describe(room)
+        panel = Panel(Text(description, justify="center"), title=f"[bold magenta]{name.upper()}[/bold magenta]", border_style="bright_blue")
         console.print(panel)
         
         # Execute room event if present
-        if "event" in room:
-            result = room["event"](player)
-            # For puzzles, if result is False, bounce back to start
+        if event_name:
+            result = EVENTS[event_name](player)
+            # For puzzles, if result is False, bounce back
             if result is False:
-                current_room = "start"
+                room = graph.retreat(room)
                 time.sleep(1)
                 continue
 
-        if current_room == "exit":
+        if room == graph.exit:
             art = r"""
   ______     ______     ______     __   __     ______    
  /\  ___\   /\  __ \   /\  ___\   /\ "-.\ \   /\  ___\   
@@ -243,8 +922,8 @@ def play_game():
 
         # List available options
         animate_text("\nAvailable actions:")
-        for key in room["options"]:
-            animate_text(f"👉 {key}", delay=0.02)
+        for choice, _ in graph.options(room):
+            animate_text(f"👉 {choice}", delay=0.02)
         animate_text("Type [bold blue]'inventory'[/bold blue] to check your items.")
         
         choice = Prompt.ask("\nWhat do you do?").lower().strip()
@@ -253,11 +932,69 @@ def play_game():
             time.sleep(1)
             continue
 
-        if choice in room["options"]:
-            current_room = room["options"][choice]
+        target = graph.option(room, choice)
+        if target is not None:
+            room = target
         else:
             animate_text("[red]Invalid choice![/red]")
             time.sleep(1)
 
 if __name__ == "__main__":
-    play_game()
+    parser = argparse.ArgumentParser(description="The Ultimate Dungeon Escape.")
+    parser.add_argument("--dungeon", default=DEFAULT_DUNGEON, metavar="PATH",
+                        help="dungeon file to play (default: Dungeon.json)")
+    parser.add_argument("--generate", type=int, metavar="ROOMS",
+                        help="play a generated dungeon of about ROOMS rooms instead of a dungeon file")
+    parser.add_argument("--no-cache", action="store_true", help="recompile the dungeon instead of using the cache")
+    parser.add_argument("--text-speed", choices=TEXT_SPEEDS, default="normal",
+                        help="typewriter speed for game text (default: normal)")
+    parser.add_argument("--no-skip", action="store_true", help="do not let a key press finish the text being typed")
+    parser.add_argument("--hints", action="store_true", help="suggest the best battle action and its win chance")
+    parser.add_argument("--simulate", type=int, metavar="FIGHTS",
+                        help="simulate FIGHTS battles per encounter and policy, print balance stats and exit")
+    parser.add_argument("--policy", type=parse_policy, action="append",
+                        help="player policy for --simulate: attack, best, defend[:HP] or potion[:HP] (repeatable)")
+    parser.add_argument("--encounter", choices=ENCOUNTERS, action="append",
+                        help="encounter for --simulate (repeatable, default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes for --simulate (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for --simulate and --generate")
+    parser.add_argument("--hp", type=int, default=100, help="starting HP for --simulate")
+    parser.add_argument("--check", action="store_true", help="validate the dungeon, print its size and exit")
+    args = parser.parse_args()
+    typewriter.speed = TEXT_SPEEDS[args.text_speed]
+    typewriter.skippable = not args.no_skip
+    show_hints = args.hints
+    if args.simulate:
+        policies = args.policy or [AlwaysAttack(), DefendBelow(), PotionBelow(), BestPlay()]
+        print_simulation(args.encounter or list(ENCOUNTERS), policies, args.simulate,
+                         args.workers, args.seed, args.hp)
+        sys.exit()
+    start = time.perf_counter()
+    if args.generate:
+        graph = ProceduralDungeon(args.generate, args.seed)
+    else:
+        graph = load_dungeon(args.dungeon, use_cache=not args.no_cache)
+    if args.check and args.generate:
+        # Walk every reachable room, which materializes all of them
+        distance = {graph.start: 0}
+        queue = deque([graph.start])
+        while queue:
+            room = queue.popleft()
+            for _, target in graph.options(room):
+                if target not in distance:
+                    distance[target] = distance[room] + 1
+                    queue.append(target)
+        elapsed = time.perf_counter() - start
+        events = [graph.describe(room)[2] for room in distance]
+        print(f"rooms: {len(distance)}  moves from start to exit: {distance.get(graph.exit, -1)}  "
+              f"enemies: {events.count('enemy')}  traps: {events.count('trap')}  puzzles: {events.count('puzzle')}")
+        print(f"generated in {elapsed * 1000:.1f} ms")
+    elif args.check:
+        elapsed = time.perf_counter() - start
+        dead_ends = sum(1 for distance in graph.exit_distance if distance < 0)
+        print(f"rooms: {len(graph)}  options: {len(graph.targets)}  "
+              f"moves from start to exit: {graph.exit_distance[graph.start]}  "
+              f"rooms that cannot reach the exit: {dead_ends}")
+        print(f"loaded in {elapsed * 1000:.1f} ms")
+    else:
+        play_game(graph)
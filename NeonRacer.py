@@ -1,12 +1,27 @@
+import argparse
 import curses
+import multiprocessing
+import os
+import struct
+import sys
 import time
 import random
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; rows are then generated in pure Python
+    np = None
 
 # --- Game Configuration ---
-TRACK_WIDTH = 40        # Width of the game track area
-TRACK_HEIGHT = 20       # Height of the game area
+TRACK_WIDTH = 40        # Width of the track without a terminal (headless runs)
+TRACK_HEIGHT = 20       # Height of the track without a terminal
 BORDER_CHAR = "║"       # Border symbol for the track
 SCORE_WIN_HEIGHT = 5    # Space for header/HUD
+TRACK_TOP = SCORE_WIN_HEIGHT + 7  # Screen row where the track starts
+TRACK_MARGIN = 2        # Columns left free on each side of the track
+MIN_TERM_WIDTH = 60     # Smallest terminal the game runs in
+MIN_TERM_HEIGHT = 32
 
 # Symbols for game elements
 PLAYER_CHAR = "➹"       # Your car
@@ -17,11 +32,24 @@ POWERUP_CHAR = "★"      # Power-up symbol
 # Timing and speed settings (milliseconds)
 INITIAL_SPEED = 100     # Lower means faster game loop
 SPEED_INCREMENT = 2     # Speed up as score increases
+MIN_SPEED = 20          # Fastest tick interval the game speeds up to
+MAX_CATCHUP_TICKS = 5   # Simulation ticks per frame before time is dropped
+INPUT_BUFFER = 4        # Keypresses queued for upcoming ticks
 
 # Chance probabilities for new elements in new rows
 OBSTACLE_PROB = 0.10    # 10% chance for a standard obstacle
 ENEMY_PROB = 0.05       # 5% chance for an enemy vehicle
 POWERUP_PROB = 0.03     # 3% chance for a power-up
+ROW_BATCH = 256         # Rows generated per refill of the prefetch queue
+
+# Autopilot sweeps
+SWEEP_MAX_TICKS = 500   # A run that survives this long counts as a survivor
+LOOKAHEAD_ROWS = 6      # How far ahead the autopilots plan
+
+# Replays
+REPLAY_MAGIC = b"NRPL"
+REPLAY_VERSION = 2
+REPLAY_CHUNK = 64 * 1024  # Bytes buffered per read/write
 
 # --- Color Pair IDs ---
 COLOR_PLAYER = 1
@@ -58,47 +86,311 @@ def draw_header(header_win, sw):
         header_win.addstr(idx, x, line, curses.color_pair(COLOR_HEADER) | curses.A_BOLD)
     header_win.noutrefresh()
 
-def draw_hud(hud_win, score, combo, active_powerup):
+def draw_hud(hud_win, score, combo, active_powerup, scheduler=None):
     hud_win.erase()
     powerup_text = f"Power-Up: {active_powerup}" if active_powerup else "Power-Up: None"
     hud_text = f" Score: {score}   Combo: {combo}   {powerup_text}   [Arrows: Move | Q: Quit] "
-    hud_win.addstr(0, 0, hud_text, curses.color_pair(COLOR_HUD))
+    if scheduler:
+        hud_text += f"  {scheduler.tick_rate:.0f} tps  Load: {scheduler.load:.0%} "
+    hud_win.addnstr(0, 0, hud_text, hud_win.getmaxyx()[1] - 1, curses.color_pair(COLOR_HUD))
     hud_win.noutrefresh()
 
-def generate_initial_map():
-    # Create initial track as a list of rows
-    # Each row is a list of characters (including borders)
-    game_map = []
-    # Top border
-    top_row = [BORDER_CHAR] * TRACK_WIDTH
-    game_map.append(top_row)
-    # Interior rows filled with blank space
-    for _ in range(TRACK_HEIGHT - 2):
-        row = [" "] * TRACK_WIDTH
-        row[0] = BORDER_CHAR
-        row[-1] = BORDER_CHAR
-        game_map.append(row)
-    # Bottom border
-    bottom_row = [BORDER_CHAR] * TRACK_WIDTH
-    game_map.append(bottom_row)
-    return game_map
-
-def add_new_row():
-    # Generate a new row with borders and random elements
-    new_row = [" "] * TRACK_WIDTH
-    new_row[0] = BORDER_CHAR
-    new_row[-1] = BORDER_CHAR
-    for x in range(1, TRACK_WIDTH - 1):
-        r = random.random()
-        if r < POWERUP_PROB:
-            new_row[x] = POWERUP_CHAR
-        elif r < POWERUP_PROB + ENEMY_PROB:
-            new_row[x] = ENEMY_CHAR
-        elif r < POWERUP_PROB + ENEMY_PROB + OBSTACLE_PROB:
-            new_row[x] = OBSTACLE_CHAR
+def build_attr_table():
+    # Precompute the curses attribute for every glyph (needs init_colors first)
+    background = curses.color_pair(COLOR_BG)
+    return {
+        " ": background,
+        OBSTACLE_CHAR: curses.color_pair(COLOR_OBSTACLE),
+        ENEMY_CHAR: curses.color_pair(COLOR_ENEMY),
+        POWERUP_CHAR: curses.color_pair(COLOR_POWERUP),
+        PLAYER_CHAR: curses.color_pair(COLOR_PLAYER) | curses.A_BOLD,
+    }
+
+# --- Track Renderer ---
+# Remembers the glyph last drawn in every interior cell and only sends the
+# cells that changed since the previous frame. The border is drawn once and
+# again after invalidate() (e.g. on terminal resize).
+class TrackRenderer:
+    def __init__(self, win, width, height):
+        self.win = win
+        self.width = width
+        self.height = height
+        self.attrs = build_attr_table()
+        self.background = self.attrs[" "]
+        self.invalidate()
+
+    def invalidate(self):
+        # Forget what is on screen so the next frame is drawn in full. The
+        # border slots hold the border glyph so a front row compares equal to
+        # a track row (borders included) once its interior is drawn.
+        self.front = [[BORDER_CHAR] + [None] * (self.width - 2) + [BORDER_CHAR]
+                      for _ in range(self.height)]
+        self.border_drawn = False
+
+    def draw_border(self):
+        # window.border() only takes single-byte characters, so draw the
+        # border glyph cell by cell
+        attr = curses.color_pair(COLOR_BORDER)
+        last = self.width - 1
+        for y in range(self.height):
+            if y == 0 or y == self.height - 1:
+                self.win.addstr(y, 0, BORDER_CHAR * last, attr)
+                # Writing the bottom-right cell moves the cursor off the window
+                try:
+                    self.win.addstr(y, last, BORDER_CHAR, attr)
+                except curses.error:
+                    pass
+            else:
+                self.win.addstr(y, 0, BORDER_CHAR, attr)
+                self.win.addstr(y, last, BORDER_CHAR, attr)
+        self.border_drawn = True
+
+    def draw(self, track, player):
+        win = self.win
+        attrs = self.attrs
+        background = self.background
+        if not self.border_drawn:
+            self.draw_border()
+        for y in range(1, self.height - 1):
+            row = track[y]
+            last = self.front[y]
+            if y != player.y:
+                # After a scroll every row holds its upper neighbour's glyphs,
+                # so this C-speed comparison only skips a row that matches
+                # the one drawn above it last frame (e.g. two empty rows)
+                if row == last:
+                    continue
+                for x in range(1, self.width - 1):
+                    ch = row[x]
+                    if ch != last[x]:
+                        win.addch(y, x, ch, attrs.get(ch, background))
+                        last[x] = ch
+            else:
+                for x in range(1, self.width - 1):
+                    ch = PLAYER_CHAR if x == player.x else row[x]
+                    if ch != last[x]:
+                        win.addch(y, x, ch, attrs.get(ch, background))
+                        last[x] = ch
+        win.noutrefresh()
+
+# --- Row Generation ---
+# Rows are produced in bulk into a prefetch queue that the track consumes one
+# row per scroll. Each cell draws one random number: a power-up below
+# POWERUP_PROB, then an enemy, then an obstacle, else blank.
+# Each queued row also carries integer bitmasks of its hazard and power-up
+# cells (bit x set for column x) so collisions are single bit tests.
+GLYPH_CODES = {POWERUP_CHAR: ord("0"), ENEMY_CHAR: ord("1"), OBSTACLE_CHAR: ord("2"), " ": ord("3")}
+HAZARD_BITS = bytes.maketrans(b"0123", b"0110")
+POWERUP_BITS = bytes.maketrans(b"0123", b"1000")
+
+class RowGenerator:
+    def __init__(self, width, batch_size=ROW_BATCH, rng=random,
+                 obstacle_prob=OBSTACLE_PROB, enemy_prob=ENEMY_PROB, powerup_prob=POWERUP_PROB):
+        self.interior = width - 2
+        self.batch_size = batch_size
+        self.rng = rng
+        self.queue = deque()
+        self.glyphs = (POWERUP_CHAR, ENEMY_CHAR, OBSTACLE_CHAR, " ")
+        self.cum_weights = (
+            powerup_prob,
+            powerup_prob + enemy_prob,
+            powerup_prob + enemy_prob + obstacle_prob,
+            1.0,
+        )
+        if np is not None:
+            # Seed NumPy from the Python RNG so seeding one seeds both
+            self.np_rng = np.random.default_rng(rng.getrandbits(64))
+            self.np_glyphs = np.array(self.glyphs)
+            self.np_thresholds = np.array(self.cum_weights[:-1])
+
+    def resize(self, width):
+        # Queued rows have the old width, so they are dropped
+        self.interior = width - 2
+        self.queue.clear()
+
+    def refill(self):
+        interior = self.interior
+        count = self.batch_size * interior
+        queue = self.queue
+        if np is not None:
+            draws = self.np_rng.random(count)
+            codes = np.searchsorted(self.np_thresholds, draws, side="right")
+            cells = self.np_glyphs[codes].tolist()
+            codes = codes.reshape(self.batch_size, interior)
+            hazards = np.packbits((codes == 1) | (codes == 2), axis=1, bitorder="little")
+            powerups = np.packbits(codes == 0, axis=1, bitorder="little")
+            for row in range(self.batch_size):
+                start = row * interior
+                queue.append((
+                    cells[start:start + interior],
+                    int.from_bytes(hazards[row].tobytes(), "little") << 1,
+                    int.from_bytes(powerups[row].tobytes(), "little") << 1,
+                ))
+        else:
+            # choices() bisects the cumulative weights in C for the whole batch;
+            # the masks are parsed from translated code bytes, also in C
+            cells = self.rng.choices(self.glyphs, cum_weights=self.cum_weights, k=count)
+            codes = bytes(map(GLYPH_CODES.__getitem__, cells))
+            hazards = codes.translate(HAZARD_BITS)
+            powerups = codes.translate(POWERUP_BITS)
+            for start in range(0, count, interior):
+                end = start + interior
+                queue.append((
+                    cells[start:end],
+                    int(hazards[start:end][::-1], 2) << 1,
+                    int(powerups[start:end][::-1], 2) << 1,
+                ))
+
+    def next_row(self):
+        # (interior cells without borders, hazard mask, power-up mask)
+        if not self.queue:
+            self.refill()
+        return self.queue.popleft()
+
+# --- Track Storage ---
+# The interior rows live in a fixed-capacity circular buffer with a moving
+# head index. Scrolling steps the head back by one and refills the recycled
+# bottom row in place, so nothing is shifted or allocated per frame.
+# track[y][x] reads exactly like the old list-of-rows map (the glyph layer);
+# hazards and powerups hold the matching per-row bitmasks.
+class Track:
+    def __init__(self, width, height, generator=None):
+        self.generator = generator or RowGenerator(width)
+        self.build(width, height)
+
+    def build(self, width, height):
+        self.width = width
+        self.height = height
+        self.capacity = height - 2
+        self.top_row = [BORDER_CHAR] * width
+        self.bottom_row = [BORDER_CHAR] * width
+        self.rows = []
+        for _ in range(self.capacity):
+            row = [" "] * width
+            row[0] = BORDER_CHAR
+            row[-1] = BORDER_CHAR
+            self.rows.append(row)
+        self.hazards = [0] * self.capacity
+        self.powerups = [0] * self.capacity
+        self.head = 0
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        if 0 < y < self.height - 1:
+            return self.rows[(self.head + y - 1) % self.capacity]
+        if y == 0:
+            return self.top_row
+        if y == self.height - 1:
+            return self.bottom_row
+        raise IndexError("track row out of range")
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield self[y]
+
+    def index(self, y):
+        # Buffer slot of interior row y
+        return (self.head + y - 1) % self.capacity
+
+    def hazard_mask(self, y):
+        return self.hazards[(self.head + y - 1) % self.capacity] if 0 < y < self.height - 1 else 0
+
+    def powerup_mask(self, y):
+        return self.powerups[(self.head + y - 1) % self.capacity] if 0 < y < self.height - 1 else 0
+
+    def take_powerup(self, x, y):
+        # Clear a power-up from both layers; returns True if there was one
+        slot = (self.head + y - 1) % self.capacity
+        bit = 1 << x
+        if not self.powerups[slot] & bit:
+            return False
+        self.powerups[slot] &= ~bit
+        self.rows[slot][x] = " "
+        return True
+
+    def scroll(self):
+        # The bottom interior row becomes the new row just below the top border
+        self.head = head = (self.head - 1) % self.capacity
+        cells, self.hazards[head], self.powerups[head] = self.generator.next_row()
+        row = self.rows[head]
+        row[1:self.width - 1] = cells
+        return row
+
+    def resize(self, width, height):
+        # Rows stay aligned to the bottom of the track, where the player is;
+        # columns stay aligned to the left. New rows and columns start empty.
+        old_rows = [(self[y], self.hazard_mask(y), self.powerup_mask(y))
+                    for y in range(1, self.height - 1)]
+        keep = min(width, self.width) - 1
+        # Columns 1..keep-1 survive in both sizes
+        column_mask = ((1 << keep) - 1) ^ 1
+        self.build(width, height)
+        offset = len(old_rows) - self.capacity
+        for slot in range(self.capacity):
+            if 0 <= slot + offset < len(old_rows):
+                row, hazards, powerups = old_rows[slot + offset]
+                self.rows[slot][1:keep] = row[1:keep]
+                self.hazards[slot] = hazards & column_mask
+                self.powerups[slot] = powerups & column_mask
+        self.generator.resize(width)
+
+# --- Frame Scheduler ---
+# The simulation advances in fixed ticks of the current speed (ms per tick)
+# while rendering happens at most once per loop iteration. If the loop falls
+# more than MAX_CATCHUP_TICKS behind, the extra time is dropped instead of
+# stalling to catch up. load is the share of the frame budget spent working.
+class FrameScheduler:
+    def __init__(self, tick_ms, clock=time.perf_counter):
+        self.clock = clock
+        self.set_speed(tick_ms)
+        self.last = clock()
+        self.accumulator = 0.0
+        self.frame_start = self.last
+        self.window_start = self.last
+        self.window_busy = 0.0
+        self.load = 0.0
+        self.skipped_ticks = 0
+
+    def reset(self):
+        # Forget time spent outside the loop (e.g. while paused)
+        self.last = self.clock()
+        self.accumulator = 0.0
+
+    def set_speed(self, tick_ms):
+        self.step = tick_ms / 1000.0
+        self.tick_rate = 1000.0 / tick_ms
+
+    def ticks_due(self):
+        # Number of simulation ticks to run this frame
+        now = self.clock()
+        self.frame_start = now
+        self.accumulator += now - self.last
+        self.last = now
+        due = int(self.accumulator // self.step)
+        if due > MAX_CATCHUP_TICKS:
+            self.skipped_ticks += due - MAX_CATCHUP_TICKS
+            due = MAX_CATCHUP_TICKS
+            self.accumulator = 0.0
         else:
-            new_row[x] = " "
-    return new_row
+            self.accumulator -= due * self.step
+        return due
+
+    def wait(self):
+        # Record the work done this frame, then sleep until the next tick
+        now = self.clock()
+        self.window_busy += now - self.frame_start
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.load = self.window_busy / elapsed
+            self.window_start = now
+            self.window_busy = 0.0
+        remaining = self.step - self.accumulator - (now - self.last)
+        if remaining > 0:
+            time.sleep(remaining)
 
 # --- Player Class ---
 class Player:
@@ -108,12 +400,13 @@ class Player:
         self.hp = 100  # Could be used for extended mechanics
         self.active_powerup = None  # e.g., "Shield", "Slow Time"
         self.powerup_timer = 0
+        self.autopilot = None  # An Autopilot that steers instead of the keyboard
 
     def move(self, dx, dy, game_map):
         new_x = self.x + dx
         new_y = self.y + dy
         # Prevent moving into borders
-        if 0 < new_x < TRACK_WIDTH - 1 and 0 < new_y < TRACK_HEIGHT - 1:
+        if 0 < new_x < len(game_map[0]) - 1 and 0 < new_y < len(game_map) - 1:
             self.x = new_x
             self.y = new_y
 
@@ -123,109 +416,664 @@ class Player:
             if self.powerup_timer <= 0:
                 self.active_powerup = None
 
-def main(stdscr):
+# --- Race Engine ---
+# One action per tick; the engine owns everything the tick touches (track
+# scrolling, collisions, power-up timers and score) so it can be stepped
+# without a terminal. All randomness comes from a seeded random.Random.
+ACTION_NONE, ACTION_LEFT, ACTION_RIGHT, ACTION_UP, ACTION_DOWN = range(5)
+ACTION_DELTAS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1))
+KEY_ACTIONS = {
+    curses.KEY_LEFT: ACTION_LEFT,
+    curses.KEY_RIGHT: ACTION_RIGHT,
+    curses.KEY_UP: ACTION_UP,
+    curses.KEY_DOWN: ACTION_DOWN,
+}
+PHASES = ("generate", "scroll", "collide", "update")
+
+class RaceEngine:
+    def __init__(self, seed=None, width=TRACK_WIDTH, height=TRACK_HEIGHT,
+                 obstacle_prob=OBSTACLE_PROB, enemy_prob=ENEMY_PROB,
+                 powerup_prob=POWERUP_PROB, speed_increment=SPEED_INCREMENT):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.config = {
+            "width": width,
+            "height": height,
+            "obstacle_prob": obstacle_prob,
+            "enemy_prob": enemy_prob,
+            "powerup_prob": powerup_prob,
+            "speed_increment": speed_increment,
+        }
+        generator = RowGenerator(width, rng=self.rng, obstacle_prob=obstacle_prob,
+                                 enemy_prob=enemy_prob, powerup_prob=powerup_prob)
+        self.track = Track(width, height, generator)
+        self.speed_increment = speed_increment
+        self.profile = False
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.reset()
+
+    def reset(self):
+        # Start a new run on the current track (the RNG keeps its state)
+        self.player = Player(self.track.width // 2, self.track.height - 2)
+        self.score = 0
+        self.combo = 0
+        self.speed = INITIAL_SPEED
+        self.tick = 0
+        self.crashed = False
+
+    def step(self, action=ACTION_NONE):
+        # Advance one tick; returns False once the player has crashed
+        if self.profile:
+            return self.step_profiled(action)
+        player = self.player
+        track = self.track
+        if action:
+            dx, dy = ACTION_DELTAS[action]
+            player.move(dx, dy, track)
+
+        # Scroll the track: recycle the bottom row as a new row at the top
+        track.scroll()
+        if self.resolve_collision():
+            return False
+        self.advance()
+        return not self.crashed
+
+    def step_profiled(self, action=ACTION_NONE):
+        # Same as step() but accumulates the time spent in each phase
+        clock = time.perf_counter
+        times = self.phase_times
+        if action:
+            dx, dy = ACTION_DELTAS[action]
+            self.player.move(dx, dy, self.track)
+        start = clock()
+        generator = self.track.generator
+        if not generator.queue:
+            generator.refill()
+        generated = clock()
+        self.track.scroll()
+        scrolled = clock()
+        crashed = self.resolve_collision()
+        collided = clock()
+        if not crashed:
+            self.advance()
+        updated = clock()
+        times["generate"] += generated - start
+        times["scroll"] += scrolled - generated
+        times["collide"] += collided - scrolled
+        times["update"] += updated - collided
+        return not self.crashed
+
+    def resolve_collision(self):
+        # Check for collisions at player's position in the new map row with
+        # bit tests on the collision layer; returns True if the player crashed
+        player = self.player
+        track = self.track
+        slot = (track.head + player.y - 1) % track.capacity
+        bit = 1 << player.x
+        if track.hazards[slot] & bit:
+            # If player has an active shield power-up, negate collision
+            if player.active_powerup == "Shield":
+                self.combo += 1  # Increase combo bonus instead of penalty
+            else:
+                self.crashed = True
+                return True
+        elif track.powerups[slot] & bit:
+            # Activate a power-up: Shield lasts for a fixed number of frames
+            player.active_powerup = "Shield"
+            player.powerup_timer = 50
+            self.combo += 5  # Bonus for collecting a power-up
+            # Clear the power-up from the map so it isn't collected repeatedly
+            track.take_powerup(player.x, player.y)
+        return False
+
+    def resize(self, width, height):
+        # Resize the track, keeping the player at the same distance from the
+        # bottom and inside the borders
+        old_height = self.track.height
+        self.track.resize(width, height)
+        self.config["width"] = width
+        self.config["height"] = height
+        player = self.player
+        player.x = min(max(player.x, 1), width - 2)
+        player.y = min(max(player.y + height - old_height, 1), height - 2)
+
+    def advance(self):
+        self.score += 1
+        self.tick += 1
+        self.player.update_powerup()
+        # Increase speed (i.e., shorten the tick) as score increases, up to a limit
+        if self.score % 100 == 0 and self.speed > MIN_SPEED:
+            self.speed = max(MIN_SPEED, self.speed - self.speed_increment)
+
+# --- Autopilots ---
+# An autopilot picks one action per tick from the engine state. After the
+# action the track scrolls one row, so the tile the player lands on t ticks
+# from now is the one currently t rows above it. Rows above the top border
+# have not been generated yet and are treated as open road.
+class Autopilot:
+    def choose(self, engine):
+        return ACTION_NONE
+
+def next_position(track, x, y, action):
+    # Where Player.move would put the player (moves into borders are ignored)
+    dx, dy = ACTION_DELTAS[action]
+    nx, ny = x + dx, y + dy
+    if 0 < nx < track.width - 1 and 0 < ny < track.height - 1:
+        return nx, ny
+    return x, y
+
+def shield_ticks(player):
+    # Number of upcoming ticks during which hazards are harmless
+    return player.powerup_timer if player.active_powerup == "Shield" else 0
+
+class GreedyPilot(Autopilot):
+    # Scores each action by the tile it lands on next tick plus how clear the
+    # column ahead of it is, and takes the best one
+    def __init__(self, lookahead=LOOKAHEAD_ROWS):
+        self.lookahead = lookahead
+
+    def choose(self, engine):
+        track = engine.track
+        player = engine.player
+        shielded = shield_ticks(player)
+        best_action = ACTION_NONE
+        best_score = None
+        for action in range(len(ACTION_DELTAS)):
+            x, y = next_position(track, player.x, player.y, action)
+            score = 0.0
+            for t in range(1, self.lookahead + 1):
+                row = y - t
+                if row < 1:
+                    break
+                if track.hazard_mask(row) >> x & 1 and t > shielded:
+                    score -= 1000.0 if t == 1 else 10.0 / t
+                elif track.powerup_mask(row) >> x & 1:
+                    score += 5.0 / t
+            if best_score is None or score > best_score:
+                best_action = action
+                best_score = score
+        return best_action
+
+class BfsPilot(Autopilot):
+    # Breadth-first search tick by tick through the upcoming rows, once per
+    # first action; returns a first action whose paths survive the longest,
+    # preferring to hold position. The positions reachable at a tick are one
+    # int with bit y * width + x set for (x, y), built from the track's row
+    # masks, so a search step is a handful of shifts and ors over the whole
+    # track, masked by the hazards that scroll onto each position.
+    def __init__(self, lookahead=LOOKAHEAD_ROWS):
+        self.lookahead = lookahead
+
+    def choose(self, engine):
+        track = engine.track
+        player = engine.player
+        shielded = shield_ticks(player)
+        width = track.width
+        interior = ((1 << (width - 1)) - 1) ^ 1
+        board = 0
+        hazards = 0
+        for y in range(1, track.height - 1):
+            board |= interior << (y * width)
+            hazards |= track.hazard_mask(y) << (y * width)
+        # open_cells[t]: where the player may be t ticks from now. Row y then
+        # holds what is in row y - t now; rows above the track are open road.
+        # Moves into a border stay put, so border cells are never open.
+        open_cells = [None]
+        for t in range(1, self.lookahead + 1):
+            open_cells.append(board & ~(hazards << (t * width)) if t > shielded else board)
+
+        best_action = ACTION_NONE
+        best_depth = -1
+        for action in range(len(ACTION_DELTAS)):
+            x, y = next_position(track, player.x, player.y, action)
+            frontier = (1 << (y * width + x)) & open_cells[1]
+            depth = 0
+            while frontier:
+                depth += 1
+                if depth == self.lookahead:
+                    break
+                # Stay, step sideways, or step up or down a row
+                frontier = (frontier | frontier >> 1 | frontier << 1
+                            | frontier >> width | frontier << width) & open_cells[depth + 1]
+            if depth > best_depth:
+                best_action = action
+                best_depth = depth
+                if depth == self.lookahead:
+                    break
+        return best_action
+
+AUTOPILOTS = {"none": Autopilot, "greedy": GreedyPilot, "bfs": BfsPilot}
+
+# --- Monte Carlo Sweeps ---
+def simulate_run(task):
+    # One seeded run under an autopilot; returns (ticks, combo, score, seconds)
+    seed, pilot_name, config, max_ticks = task
+    engine = RaceEngine(seed, **config)
+    pilot = AUTOPILOTS[pilot_name]()
+    seconds = 0.0
+    while engine.tick < max_ticks:
+        seconds += engine.speed / 1000.0
+        if not engine.step(pilot.choose(engine)):
+            break
+    return engine.tick, engine.combo, engine.score, seconds
+
+def summarize(values):
+    ordered = sorted(values)
+    count = len(ordered)
+    return {
+        "mean": sum(ordered) / count,
+        "min": ordered[0],
+        "p10": ordered[count // 10],
+        "p50": ordered[count // 2],
+        "p90": ordered[min(count - 1, count * 9 // 10)],
+        "max": ordered[-1],
+    }
+
+def run_sweep(runs, pilot="greedy", seed=0, max_ticks=SWEEP_MAX_TICKS, workers=None, **config):
+    # Simulate `runs` seeded runs across a process pool and aggregate them
+    workers = workers or os.cpu_count() or 1
+    tasks = [(seed + i, pilot, config, max_ticks) for i in range(runs)]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [simulate_run(task) for task in tasks]
+    else:
+        chunksize = max(1, runs // (workers * 8))
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(simulate_run, tasks, chunksize)
+    elapsed = time.perf_counter() - start
+    ticks, combos, scores, seconds = zip(*results)
+    return {
+        "runs": runs,
+        "pilot": pilot,
+        "workers": workers,
+        "elapsed": elapsed,
+        "survivors": sum(1 for t in ticks if t >= max_ticks),
+        "ticks": summarize(ticks),
+        "combo": summarize(combos),
+        "score": summarize(scores),
+        "seconds": summarize(seconds),
+    }
+
+def print_sweep(report):
+    print(f"{report['runs']} runs with the {report['pilot']} autopilot on "
+          f"{report['workers']} workers in {report['elapsed']:.2f} s")
+    print(f"survived to the tick cap: {report['survivors']}")
+    print(f"{'':<10}{'mean':>10}{'min':>8}{'p10':>8}{'p50':>8}{'p90':>8}{'max':>8}")
+    for name in ("ticks", "combo", "score", "seconds"):
+        stats = report[name]
+        print(f"{name:<10}{stats['mean']:>10.1f}{stats['min']:>8.0f}{stats['p10']:>8.0f}"
+              f"{stats['p50']:>8.0f}{stats['p90']:>8.0f}{stats['max']:>8.0f}")
+
+# --- Headless Benchmark ---
+def run_headless(ticks, seed=0, width=TRACK_WIDTH, height=TRACK_HEIGHT):
+    # Step the engine as fast as possible with no terminal attached. The
+    # player never steers, so crashes restart the run on the same track.
+    engine = RaceEngine(seed, width, height)
+    crashes = 0
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        if not engine.step():
+            crashes += 1
+            engine.reset()
+    elapsed = time.perf_counter() - start
+    net_blocks = sys.getallocatedblocks() - blocks_before
+
+    # Second pass with per-phase timers, kept apart so they don't skew ticks/sec
+    profiled = RaceEngine(seed, width, height)
+    profiled.profile = True
+    for _ in range(ticks):
+        if not profiled.step():
+            profiled.reset()
+    return {
+        "ticks": ticks,
+        "seconds": elapsed,
+        "ticks_per_sec": ticks / elapsed if elapsed else float("inf"),
+        "net_blocks_per_tick": net_blocks / ticks,
+        "crashes": crashes,
+        "phases": profiled.phase_times,
+    }
+
+def print_benchmark(report):
+    print(f"ticks:            {report['ticks']}")
+    print(f"elapsed:          {report['seconds']:.3f} s")
+    print(f"ticks/sec:        {report['ticks_per_sec']:.0f}")
+    print(f"net blocks/tick:  {report['net_blocks_per_tick']:.3f}")
+    print(f"crashes:          {report['crashes']}")
+    total = sum(report["phases"].values()) or 1.0
+    for name, seconds in report["phases"].items():
+        per_tick = seconds / report["ticks"] * 1e6
+        print(f"  {name:<10} {per_tick:8.2f} us/tick  {seconds / total:6.1%}")
+
+# --- Replays ---
+# A replay is a fixed header (seed, track size, spawn probabilities and the
+# row generator backend) followed by the per-tick action stream. Each body
+# byte packs an action in the top 3 bits and a run length of 1-32 ticks in
+# the low 5 bits, so a replay costs at most one byte per tick and much less
+# while the player holds still. A track resize is the escape byte
+# RESIZE_CODE << 5 followed by the new width and height; it does not use
+# up a tick. Both ends stream in REPLAY_CHUNK blocks.
+REPLAY_HEADER = struct.Struct("<4sBBqHHdddH")
+RESIZE_RECORD = struct.Struct("<HH")
+RESIZE_CODE = 7
+MAX_RUN = 32
+
+class ReplayWriter:
+    def __init__(self, path, engine):
+        self.file = open(path, "wb")
+        config = engine.config
+        self.file.write(REPLAY_HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION, 1 if np is not None else 0, engine.seed,
+            config["width"], config["height"], config["obstacle_prob"],
+            config["enemy_prob"], config["powerup_prob"], config["speed_increment"],
+        ))
+        self.buffer = bytearray()
+        self.action = ACTION_NONE
+        self.run = 0
+
+    def record(self, action):
+        if action == self.action and self.run < MAX_RUN:
+            self.run += 1
+            return
+        self.flush_run()
+        self.action = action
+        self.run = 1
+
+    def record_resize(self, width, height):
+        self.flush_run()
+        self.buffer.append(RESIZE_CODE << 5)
+        self.buffer += RESIZE_RECORD.pack(width, height)
+
+    def flush_run(self):
+        if self.run:
+            self.buffer.append(self.action << 5 | (self.run - 1))
+            self.run = 0
+        if len(self.buffer) >= REPLAY_CHUNK:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+
+    def close(self):
+        self.flush_run()
+        self.file.write(self.buffer)
+        self.file.close()
+
+class ReplayReader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(REPLAY_HEADER.size)
+        if len(header) < REPLAY_HEADER.size:
+            raise ValueError(f"{path}: not a NeonRacer replay")
+        (magic, version, numpy_rows, self.seed, width, height, obstacle_prob,
+         enemy_prob, powerup_prob, speed_increment) = REPLAY_HEADER.unpack(header)
+        if magic != REPLAY_MAGIC:
+            raise ValueError(f"{path}: not a NeonRacer replay")
+        if version != REPLAY_VERSION:
+            raise ValueError(f"{path}: unsupported replay version {version}")
+        if bool(numpy_rows) != (np is not None):
+            # The two row generator backends draw different tracks from one seed
+            needed = "with" if numpy_rows else "without"
+            raise ValueError(f"{path}: replay was recorded {needed} NumPy and can only be played back {needed} it")
+        self.config = {
+            "width": width,
+            "height": height,
+            "obstacle_prob": obstacle_prob,
+            "enemy_prob": enemy_prob,
+            "powerup_prob": powerup_prob,
+            "speed_increment": speed_increment,
+        }
+
+    def make_engine(self):
+        return RaceEngine(self.seed, **self.config)
+
+    def __iter__(self):
+        # Yields one action per recorded tick and a (width, height) tuple for
+        # each track resize, reading the file in chunks
+        with open(self.path, "rb") as f:
+            f.seek(REPLAY_HEADER.size)
+            data = f.read(REPLAY_CHUNK)
+            pos = 0
+            while pos < len(data):
+                packed = data[pos]
+                pos += 1
+                action = packed >> 5
+                if action == RESIZE_CODE:
+                    if len(data) - pos < RESIZE_RECORD.size:
+                        data = data[pos:] + f.read(REPLAY_CHUNK)
+                        pos = 0
+                    yield RESIZE_RECORD.unpack_from(data, pos)
+                    pos += RESIZE_RECORD.size
+                else:
+                    for _ in range((packed & 31) + 1):
+                        yield action
+                if pos >= len(data):
+                    data = f.read(REPLAY_CHUNK)
+                    pos = 0
+
+def run_replay(path):
+    # Step a replay through the engine as fast as possible without rendering
+    replay = ReplayReader(path)
+    engine = replay.make_engine()
+    start = time.perf_counter()
+    for action in replay:
+        if isinstance(action, tuple):
+            engine.resize(*action)
+        elif not engine.step(action):
+            break
+    elapsed = time.perf_counter() - start
+    return {
+        "ticks": engine.tick,
+        "score": engine.score,
+        "combo": engine.combo,
+        "crashed": engine.crashed,
+        "seconds": elapsed,
+        "ticks_per_sec": engine.tick / elapsed if elapsed else float("inf"),
+    }
+
+# --- Screen Layout ---
+def track_size_for(sh, sw):
+    # The largest track that fits below the header and HUD
+    return sw - 2 * TRACK_MARGIN, sh - TRACK_TOP
+
+class Screen:
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.game_win = None
+        self.hud_state = None
+
+    def too_small(self):
+        sh, sw = self.stdscr.getmaxyx()
+        return sh < MIN_TERM_HEIGHT or sw < MIN_TERM_WIDTH
+
+    def layout(self, width, height):
+        # (Re)create the windows around a width x height track. Returns False
+        # and shows a notice instead if the track does not fit the terminal.
+        stdscr = self.stdscr
+        sh, sw = stdscr.getmaxyx()
+        stdscr.clear()
+        if self.too_small() or width > sw or height > sh - TRACK_TOP:
+            self.game_win = None
+            notice = f"Terminal too small! Resize to at least {max(MIN_TERM_WIDTH, width)}x{max(MIN_TERM_HEIGHT, height + TRACK_TOP)}."
+            stdscr.addnstr(0, 0, notice, sw - 1)
+            stdscr.refresh()
+            return False
+        stdscr.noutrefresh()
+        self.header_win = curses.newwin(7, sw, 0, 0)
+        self.hud_win = curses.newwin(1, sw, 7, 0)
+        self.game_win = curses.newwin(height, width, TRACK_TOP, (sw - width) // 2)
+        self.game_win.keypad(True)
+        self.game_win.nodelay(True)
+        self.renderer = TrackRenderer(self.game_win, width, height)
+        self.hud_state = None
+        # The logo never changes, so it is only drawn here (at start and on resize)
+        draw_header(self.header_win, sw)
+        return True
+
+    def getch(self):
+        return (self.game_win or self.stdscr).getch()
+
+    def draw(self, engine, scheduler):
+        player = engine.player
+        hud = (engine.score, engine.combo, player.active_powerup, round(scheduler.load, 2))
+        if self.hud_state != hud:
+            self.hud_state = hud
+            draw_hud(self.hud_win, engine.score, engine.combo, player.active_powerup, scheduler)
+        # Draw only the cells that changed since the last frame
+        self.renderer.draw(engine.track, player)
+        curses.doupdate()
+
+def main(stdscr, seed=None, autopilot=None, record=None, replay=None, fast=False):
     curses.curs_set(0)
     stdscr.nodelay(True)
-    stdscr.timeout(INITIAL_SPEED)
     init_colors()
+    screen = Screen(stdscr)
 
     sh, sw = stdscr.getmaxyx()
     # Check for minimum terminal size
-    if sh < 32 or sw < 60:
-        stdscr.addstr(0, 0, "Terminal too small! Resize to at least 60x32 and try again.")
+    if screen.too_small():
+        stdscr.addstr(0, 0, f"Terminal too small! Resize to at least {MIN_TERM_WIDTH}x{MIN_TERM_HEIGHT} and try again.")
         stdscr.refresh()
+        stdscr.nodelay(False)
+        stdscr.getch()
+        return
+
+    # Initialize the engine (track and player); live games size the track
+    # to the terminal
+    if replay:
+        engine = replay.make_engine()
+        actions = iter(replay)
+    else:
+        # Replays need a known seed, so pick one if none was given
+        width, height = track_size_for(sh, sw)
+        engine = RaceEngine(random.getrandbits(63) if seed is None else seed, width, height)
+        engine.player.autopilot = autopilot
+        actions = None
+    if not screen.layout(engine.track.width, engine.track.height):
+        stdscr.nodelay(False)
         stdscr.getch()
         return
+    recorder = ReplayWriter(record, engine) if record else None
+
+    try:
+        if not play(screen, engine, recorder, actions, fast):
+            return
+    finally:
+        if recorder:
+            recorder.close()
 
-    # Create windows: header, HUD, and game area
-    header_win = curses.newwin(7, sw, 0, 0)
-    hud_win = curses.newwin(1, sw, 7, 0)
-    game_win = curses.newwin(TRACK_HEIGHT, TRACK_WIDTH, SCORE_WIN_HEIGHT + 7, (sw - TRACK_WIDTH) // 2)
-    game_win.keypad(True)
-    
-    # Initialize track map and player
-    game_map = generate_initial_map()
-    player = Player(TRACK_WIDTH // 2, TRACK_HEIGHT - 2)
-    
-    score = 0
-    combo = 0
-    speed = INITIAL_SPEED
-    frame = 0
+    sh, sw = stdscr.getmaxyx()
+    stdscr.addstr(sh//2, (sw - 20)//2, "  GAME OVER  ", curses.color_pair(COLOR_OBSTACLE) | curses.A_BOLD)
+    stdscr.refresh()
+    stdscr.nodelay(False)
+    stdscr.getch()
+
+def play(screen, engine, recorder=None, actions=None, fast=False):
+    # Run the game loop until the player crashes (True), quits or the
+    # replay ends (False). Replays take actions from `actions`; `fast`
+    # steps one tick per frame without waiting for the scheduler.
+    speed = engine.speed
+    scheduler = FrameScheduler(speed)
+    keys = deque(maxlen=INPUT_BUFFER)
+    screen.draw(engine, scheduler)
 
     # Main Game Loop
-    while True:
-        stdscr.erase()
-        draw_header(header_win, sw)
-        draw_hud(hud_win, score, combo, player.active_powerup)
-
-        # Draw game window border with color
-        game_win.border(BORDER_CHAR, BORDER_CHAR, BORDER_CHAR, BORDER_CHAR)
-        # Draw game map
-        for y in range(1, TRACK_HEIGHT - 1):
-            for x in range(1, TRACK_WIDTH - 1):
-                ch = game_map[y][x]
-                if ch == OBSTACLE_CHAR:
-                    color = COLOR_OBSTACLE
-                elif ch == ENEMY_CHAR:
-                    color = COLOR_ENEMY
-                elif ch == POWERUP_CHAR:
-                    color = COLOR_POWERUP
-                else:
-                    color = COLOR_BG
-                game_win.addch(y, x, ch, curses.color_pair(color))
-        # Draw player
-        game_win.addch(player.y, player.x, PLAYER_CHAR, curses.color_pair(COLOR_PLAYER) | curses.A_BOLD)
-        
-        game_win.noutrefresh()
-        curses.doupdate()
+    while not engine.crashed:
+        # Poll input without blocking; moves are applied one per tick
+        key = screen.getch()
+        while key != -1:
+            if key == ord("q"):
+                return False
+            elif key == curses.KEY_RESIZE:
+                if actions is None and not screen.too_small():
+                    # Live games grow or shrink the track with the terminal
+                    size = track_size_for(*screen.stdscr.getmaxyx())
+                    if size != (engine.track.width, engine.track.height):
+                        engine.resize(*size)
+                        if recorder:
+                            recorder.record_resize(*size)
+                screen.layout(engine.track.width, engine.track.height)
+            elif key in KEY_ACTIONS:
+                keys.append(KEY_ACTIONS[key])
+            key = screen.getch()
 
-        # Handle user input
-        key = game_win.getch()
-        if key == ord("q"):
-            break
-        elif key == curses.KEY_LEFT:
-            player.move(-1, 0, game_map)
-        elif key == curses.KEY_RIGHT:
-            player.move(1, 0, game_map)
-        elif key == curses.KEY_UP:
-            player.move(0, -1, game_map)
-        elif key == curses.KEY_DOWN:
-            player.move(0, 1, game_map)
-
-        # Scroll the track: add a new row at the top and remove the bottom row
-        new_row = add_new_row()
-        game_map.pop()          # Remove bottom row
-        game_map.insert(1, new_row)  # Insert new row just below top border
-
-        # Check for collisions at player's position in the new map row:
-        current_tile = game_map[player.y][player.x]
-        if current_tile in [OBSTACLE_CHAR, ENEMY_CHAR]:
-            # If player has an active shield power-up, negate collision
-            if player.active_powerup == "Shield":
-                combo += 1  # Increase combo bonus instead of penalty
+        if not screen.game_win:
+            # Paused until the terminal is large enough again
+            curses.napms(100)
+            scheduler.reset()
+            continue
+
+        ticks = 1 if fast else scheduler.ticks_due()
+        for _ in range(ticks):
+            player = engine.player
+            if actions is not None:
+                action = next(actions, None)
+                while isinstance(action, tuple):
+                    engine.resize(*action)
+                    if not screen.layout(*action):
+                        return False
+                    action = next(actions, None)
+                if action is None:
+                    return False
+            elif player.autopilot:
+                action = player.autopilot.choose(engine)
             else:
-                stdscr.addstr(sh//2, (sw - 20)//2, "  GAME OVER  ", curses.color_pair(COLOR_OBSTACLE) | curses.A_BOLD)
-                stdscr.refresh()
-                stdscr.nodelay(False)
-                stdscr.getch()
+                action = keys.popleft() if keys else ACTION_NONE
+            if recorder:
+                recorder.record(action)
+            if not engine.step(action):
                 break
-        elif current_tile == POWERUP_CHAR:
-            # Activate a power-up: Shield lasts for a fixed number of frames
-            player.active_powerup = "Shield"
-            player.powerup_timer = 50
-            combo += 5  # Bonus for collecting a power-up
-            # Clear the power-up from the map so it isn't collected repeatedly
-            game_map[player.y][player.x] = " "
-
-        score += 1
-        player.update_powerup()
+        if engine.speed != speed:
+            speed = engine.speed
+            scheduler.set_speed(speed)
 
-        # Increase speed (i.e., decrease timeout) as score increases, up to a limit
-        if score % 100 == 0 and speed > 20:
-            speed -= SPEED_INCREMENT
-            stdscr.timeout(speed)
+        if ticks:
+            screen.draw(engine, scheduler)
 
-        time.sleep(0.05)
-        frame += 1
+        if not engine.crashed and not fast:
+            scheduler.wait()
+    return True
 
-curses.wrapper(main)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NeonRacer: a terminal racing game.")
+    parser.add_argument("--seed", type=int, help="seed the track generator")
+    parser.add_argument("--headless", type=int, metavar="TICKS",
+                        help="run TICKS simulation ticks without a terminal and report throughput")
+    parser.add_argument("--width", type=int, default=TRACK_WIDTH, help="track width for --headless")
+    parser.add_argument("--height", type=int, default=TRACK_HEIGHT, help="track height for --headless")
+    parser.add_argument("--autopilot", choices=sorted(AUTOPILOTS),
+                        help="let an autopilot drive (and pick the policy for --sweep)")
+    parser.add_argument("--sweep", type=int, metavar="RUNS",
+                        help="simulate RUNS seeded autopilot runs and report distributions")
+    parser.add_argument("--workers", type=int, help="processes for --sweep (default: all cores)")
+    parser.add_argument("--max-ticks", type=int, default=SWEEP_MAX_TICKS, help="tick cap per --sweep run")
+    parser.add_argument("--obstacle-prob", type=float, default=OBSTACLE_PROB)
+    parser.add_argument("--enemy-prob", type=float, default=ENEMY_PROB)
+    parser.add_argument("--powerup-prob", type=float, default=POWERUP_PROB)
+    parser.add_argument("--speed-increment", type=int, default=SPEED_INCREMENT)
+    parser.add_argument("--record", metavar="PATH", help="record the session as a replay")
+    parser.add_argument("--replay", metavar="PATH", help="play back a recorded replay")
+    parser.add_argument("--fast", action="store_true", help="play the replay back as fast as possible")
+    parser.add_argument("--no-render", action="store_true",
+                        help="step the replay without a terminal and report throughput")
+    args = parser.parse_args()
+    if args.record and args.seed is not None and not -2**63 <= args.seed < 2**63:
+        parser.error("--seed must fit in a signed 64-bit integer to be recorded")
+    if args.replay and args.no_render:
+        report = run_replay(args.replay)
+        print(f"ticks: {report['ticks']}  score: {report['score']}  combo: {report['combo']}  "
+              f"crashed: {report['crashed']}")
+        print(f"{report['ticks_per_sec']:.0f} ticks/sec ({report['seconds']:.3f} s)")
+    elif args.replay:
+        curses.wrapper(main, replay=ReplayReader(args.replay), fast=args.fast)
+    elif args.sweep:
+        print_sweep(run_sweep(args.sweep, args.autopilot or "greedy", args.seed or 0,
+                              args.max_ticks, args.workers,
+                              width=args.width, height=args.height,
+                              obstacle_prob=args.obstacle_prob, enemy_prob=args.enemy_prob,
+                              powerup_prob=args.powerup_prob,
+                              speed_increment=args.speed_increment))
+    elif args.headless:
+        print_benchmark(run_headless(args.headless, args.seed or 0, args.width, args.height))
+    else:
+        pilot = AUTOPILOTS[args.autopilot]() if args.autopilot else None
+        curses.wrapper(main, args.seed, pilot, args.record)
@@ -1,11 +1,64 @@
+import argparse
 import curses
+import heapq
+import itertools
+import mmap
+import os
 import time
 import random
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from collections import OrderedDict, deque
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; enemies then move in pure Python
+    np = None
 
 # Game configuration
-MAP_WIDTH = 40
+MAP_WIDTH = 40          # Also the size of the camera viewport on large worlds
 MAP_HEIGHT = 20
 
+# Large worlds are split into CHUNK_SIZE x CHUNK_SIZE chunks generated on
+# first touch; at most CHUNK_CACHE of them are kept in memory at once
+CHUNK_SIZE = 32
+CHUNK_CACHE = 64
+
+# The EXIT tile leads one level deeper, STAIRS_UP back up; escaping needs
+# the exit of the deepest level. Generated levels stay in memory up to
+# LEVEL_CACHE_BYTES (ENEMY_BYTES is the estimated cost of one enemy's packed
+# columns and index entry) and beyond that spill to disk
+DUNGEON_DEPTH = 10
+LEVEL_CACHE_BYTES = 256 * 1024
+ENEMY_BYTES = 120
+
+# Enemy AI modes: "wander" (random steps), "chase" or "flee" the player.
+# ENEMY_AI is the mode when --ai is not given
+AI_MODES = ("wander", "chase", "flee")
+ENEMY_AI = "wander"
+AI_RADIUS = 12          # Steps from the player within which enemies chase/flee
+FAR_INTERVAL = 4        # Enemies further away move once every this many ticks
+
+# --stress: enemies and map size for the headless enemy benchmark
+STRESS_ENEMIES = 10000
+STRESS_SIZE = (400, 200)
+STRESS_TICKS = 200
+
+# Fog of war: how far the player sees, and how many positions' visible sets
+# are kept
+FOV_RADIUS = 8
+FOV_CACHE = 256
+
+# Status messages below the map: how many rows, how long they stay up, and
+# the pause between battle rounds (seconds)
+MESSAGE_LINES = 4
+MESSAGE_TIME = 1.5
+ROUND_DELAY = 0.8
+FRAME_TIME = 0.25       # Game time per frame: the input wait plus the frame sleep
+
 # Define tile symbols
 WALL = "#"
 FLOOR = "."
@@ -14,6 +67,7 @@ TREASURE = "T"
 TRAP = "X"
 ENEMY_CHAR = "E"
 EXIT = "O"
+STAIRS_UP = "<"
 
 # Color pair IDs
 COLOR_DEFAULT = 1
@@ -35,54 +89,156 @@ def init_colors():
     curses.init_pair(COLOR_ENEMY, curses.COLOR_MAGENTA, curses.COLOR_BLACK)
     curses.init_pair(COLOR_EXIT, curses.COLOR_CYAN, curses.COLOR_BLACK)
 
-def generate_map():
-    game_map = [[FLOOR for _ in range(MAP_WIDTH)] for _ in range(MAP_HEIGHT)]
-    # Build borders
-    for x in range(MAP_WIDTH):
-        game_map[0][x] = WALL
-        game_map[MAP_HEIGHT - 1][x] = WALL
-    for y in range(MAP_HEIGHT):
-        game_map[y][0] = WALL
-        game_map[y][MAP_WIDTH - 1] = WALL
-
-    # Random walls
-    for _ in range(100):
-        x = random.randint(1, MAP_WIDTH - 2)
-        y = random.randint(1, MAP_HEIGHT - 2)
-        game_map[y][x] = WALL
-
-    # Random treasures
-    for _ in range(10):
-        x = random.randint(1, MAP_WIDTH - 2)
-        y = random.randint(1, MAP_HEIGHT - 2)
-        if game_map[y][x] == FLOOR:
-            game_map[y][x] = TREASURE
-
-    # Random traps
-    for _ in range(8):
-        x = random.randint(1, MAP_WIDTH - 2)
-        y = random.randint(1, MAP_HEIGHT - 2)
-        if game_map[y][x] == FLOOR:
-            game_map[y][x] = TRAP
-
-    # Random enemies
-    for _ in range(6):
-        x = random.randint(1, MAP_WIDTH - 2)
-        y = random.randint(1, MAP_HEIGHT - 2)
-        if game_map[y][x] == FLOOR:
-            game_map[y][x] = ENEMY_CHAR
-
-    # Place exit in bottom right quadrant
-    exit_placed = False
-    while not exit_placed:
-        x = random.randint(MAP_WIDTH//2, MAP_WIDTH - 2)
-        y = random.randint(MAP_HEIGHT//2, MAP_HEIGHT - 2)
-        if game_map[y][x] == FLOOR:
-            game_map[y][x] = EXIT
-            exit_placed = True
+# Map storage: one byte per cell holding the tile's ASCII code, row-major in
+# a bytearray. That is a byte a cell instead of a list slot pointing at a
+# str, and whole-map scans (find_all) run as bytearray.find in C. ChunkedWorld
+# offers the same get/set/row/neighbours interface for large worlds.
+class Grid:
+    def __init__(self, width, height, fill=FLOOR):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(fill.encode("ascii")) * (width * height)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x, y):
+        return chr(self.cells[y * self.width + x])
+
+    def set(self, x, y, tile):
+        self.cells[y * self.width + x] = ord(tile)
+
+    def fill(self, x0, y0, x1, y1, tile):
+        # Set every cell with x0 <= x < x1 and y0 <= y < y1
+        run = tile.encode("ascii") * (x1 - x0)
+        for y in range(y0, y1):
+            start = y * self.width + x0
+            self.cells[start:start + len(run)] = run
+
+    def neighbours(self, x, y):
+        for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                yield nx, ny
+
+    def row(self, y, x0=0, x1=None):
+        # Tiles x0..x1 of row y as a str, for the renderer
+        start = y * self.width
+        end = start + (self.width if x1 is None else x1)
+        return self.cells[start + x0:end].decode("ascii")
+
+    def find_all(self, tile):
+        code = ord(tile)
+        cells = self.cells
+        i = cells.find(code)
+        while i != -1:
+            yield i % self.width, i // self.width
+            i = cells.find(code, i + 1)
+
+    def snapshot(self):
+        # An immutable copy of the cells (a single memcpy) for save or undo
+        return bytes(self.cells)
+
+    def restore(self, snapshot):
+        self.cells[:] = snapshot
+
+# Tiles scattered over a classic MAP_WIDTH x MAP_HEIGHT map; bigger maps and
+# world chunks scale the counts by interior area
+MAP_FEATURES = ((WALL, 100), (TREASURE, 10), (TRAP, 8), (ENEMY_CHAR, 6))
+CLASSIC_AREA = (MAP_WIDTH - 2) * (MAP_HEIGHT - 2)
+BENCH_SIZES = ((40, 20), (80, 40), (160, 80), (320, 160))
+
+def connect_regions(game_map, start=(1, 1)):
+    # Flood fill from the start; every floor region it misses gets an
+    # L-shaped corridor carved toward the start until it meets a cell that is
+    # already reachable. Returns the number of corridors carved
+    width = game_map.width
+    height = game_map.height
+    reached = [[False] * width for _ in range(height)]
+
+    def fill(x, y):
+        reached[y][x] = True
+        queue = deque([(x, y)])
+        while queue:
+            x, y = queue.popleft()
+            for nx, ny in game_map.neighbours(x, y):
+                if not reached[ny][nx] and game_map.get(nx, ny) != WALL:
+                    reached[ny][nx] = True
+                    queue.append((nx, ny))
+
+    sx, sy = start
+    fill(sx, sy)
+    corridors = 0
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            if reached[y][x] or game_map.get(x, y) == WALL:
+                continue
+            cx, cy = x, y
+            while not reached[cy][cx]:
+                if cx != sx:
+                    cx += 1 if sx > cx else -1
+                else:
+                    cy += 1 if sy > cy else -1
+                if game_map.get(cx, cy) == WALL:
+                    game_map.set(cx, cy, FLOOR)
+            # Also picks up any region the corridor happened to cut through
+            fill(x, y)
+            corridors += 1
+    return corridors
+
+def generate_map(width=MAP_WIDTH, height=MAP_HEIGHT, seed=None):
+    rng = random.Random(seed)
+    # Walls all round a floor interior
+    game_map = Grid(width, height, WALL)
+    game_map.fill(1, 1, width - 1, height - 1, FLOOR)
+
+    # Random walls, then make sure every open cell can be walked to
+    scale = (width - 2) * (height - 2) / CLASSIC_AREA
+    (_, wall_count), *items = MAP_FEATURES
+    for _ in range(round(wall_count * scale)):
+        x = rng.randint(1, width - 2)
+        y = rng.randint(1, height - 2)
+        game_map.set(x, y, WALL)
+    game_map.set(1, 1, FLOOR)
+    connect_regions(game_map)
+    open_cells = [cell for cell in game_map.find_all(FLOOR) if cell != (1, 1)]
+
+    # Exit in the bottom right quadrant, or the last open cell if walls fill it
+    corner = [(x, y) for x, y in open_cells if x >= width // 2 and y >= height // 2]
+    exit_x, exit_y = rng.choice(corner) if corner else open_cells[-1]
+    game_map.set(exit_x, exit_y, EXIT)
+    open_cells.remove((exit_x, exit_y))
+
+    # Treasures, traps and enemies on distinct reachable cells
+    counts = [round(count * scale) for _, count in items]
+    picked = iter(rng.sample(open_cells, min(sum(counts), len(open_cells))))
+    for (tile, _), count in zip(items, counts):
+        for x, y in itertools.islice(picked, count):
+            game_map.set(x, y, tile)
 
     return game_map
 
+def benchmark_generation(sizes=BENCH_SIZES, seconds=1.0):
+    # Maps generated per second at each size, on a fresh seed per map
+    report = []
+    for width, height in sizes:
+        maps = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < seconds:
+            generate_map(width, height, seed=maps)
+            maps += 1
+            elapsed = time.perf_counter() - start
+        report.append({"size": (width, height), "maps": maps, "seconds": elapsed,
+                       "maps_per_sec": maps / elapsed})
+    return report
+
+def print_generation_benchmark(report):
+    for row in report:
+        width, height = row["size"]
+        size = f"{width}x{height}"
+        print(f"{size:>9}  {row['maps']:6d} maps  {row['seconds']:6.3f} s  "
+              f"{row['maps_per_sec']:9.1f} maps/sec")
+
 # Player class with movement and stats
 class Player:
     def __init__(self, x, y):
@@ -95,178 +251,1419 @@ class Player:
     def move(self, dx, dy, game_map):
         new_x = self.x + dx
         new_y = self.y + dy
-        if 0 <= new_x < MAP_WIDTH and 0 <= new_y < MAP_HEIGHT:
-            if game_map[new_y][new_x] != WALL:
+        if 0 <= new_x < game_map.width and 0 <= new_y < game_map.height:
+            if game_map.get(new_x, new_y) != WALL:
                 self.x = new_x
                 self.y = new_y
 
-# Enemy class with basic AI (they wander randomly)
+# Enemy record: position and HP. EnemyManager hands these out as snapshots
 class Enemy:
-    def __init__(self, x, y):
+    def __init__(self, x, y, hp=None):
         self.x = x
         self.y = y
-        self.hp = random.randint(20, 40)
-
-    def move_random(self, game_map):
-        # Try to move in a random direction (only on FLOOR)
-        dirs = [(0,1), (0,-1), (1,0), (-1,0)]
-        random.shuffle(dirs)
-        for dx, dy in dirs:
-            new_x = self.x + dx
-            new_y = self.y + dy
-            if 0 < new_x < MAP_WIDTH-1 and 0 < new_y < MAP_HEIGHT-1:
-                if game_map[new_y][new_x] == FLOOR:
-                    self.x = new_x
-                    self.y = new_y
+        self.hp = random.randint(20, 40) if hp is None else hp
+
+# Enemy manager: every enemy's x, y and HP live in packed columns, NumPy
+# int32 arrays when NumPy is installed and array("i") otherwise, with a
+# (x, y) -> index dict for lookups. Enemies handed out by at(), in_region()
+# and iteration are snapshots. A tick moves enemies one step each:
+# - inside `region` (near the player) every tick, chasing or fleeing along
+#   the distance field when there is one, wandering otherwise
+# - elsewhere, on a Grid map, a staggered 1 in FAR_INTERVAL of them per
+#   tick, wandering; on a ChunkedWorld they sleep so that distant chunks
+#   are not loaded
+# Wandering is one random step onto FLOOR that no enemy occupies or also
+# targets; with NumPy all wanderers step at once and the index is rebuilt
+# lazily on the next lookup.
+STEPS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+FLOOR_CODE = ord(FLOOR)
+
+class EnemyManager:
+    def __init__(self):
+        self.count = 0
+        self.ticks = 0
+        self.cells = {}     # (x, y) -> index; None until rebuilt after a NumPy tick
+        if np is not None:
+            self.xs = np.zeros(64, np.int32)
+            self.ys = np.zeros(64, np.int32)
+            self.hp = np.zeros(64, np.int32)
+        else:
+            self.xs = array("i")
+            self.ys = array("i")
+            self.hp = array("i")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter([Enemy(x, y, hp) for x, y, hp in zip(*self.columns())])
+
+    def columns(self):
+        # x, y and hp of every enemy as three sequences
+        n = self.count
+        if np is not None:
+            return self.xs[:n].tolist(), self.ys[:n].tolist(), self.hp[:n].tolist()
+        return self.xs, self.ys, self.hp
+
+    def index(self):
+        if self.cells is None:
+            xs, ys, _ = self.columns()
+            self.cells = dict(zip(zip(xs, ys), range(self.count)))
+        return self.cells
+
+    def find(self, x, y):
+        # Index of the enemy at (x, y) or None, without rebuilding the index
+        if self.cells is not None:
+            return self.cells.get((x, y))
+        n = self.count
+        hits = np.flatnonzero((self.xs[:n] == x) & (self.ys[:n] == y))
+        return int(hits[0]) if len(hits) else None
+
+    def add(self, enemy):
+        cells = self.index()
+        if (enemy.x, enemy.y) in cells:
+            return False
+        n = self.count
+        if np is not None:
+            if n == len(self.xs):
+                self.xs = np.concatenate((self.xs, np.zeros_like(self.xs)))
+                self.ys = np.concatenate((self.ys, np.zeros_like(self.ys)))
+                self.hp = np.concatenate((self.hp, np.zeros_like(self.hp)))
+            self.xs[n] = enemy.x
+            self.ys[n] = enemy.y
+            self.hp[n] = enemy.hp
+        else:
+            self.xs.append(enemy.x)
+            self.ys.append(enemy.y)
+            self.hp.append(enemy.hp)
+        cells[(enemy.x, enemy.y)] = n
+        self.count += 1
+        return True
+
+    def at(self, x, y):
+        i = self.find(x, y)
+        if i is None:
+            return None
+        return Enemy(x, y, int(self.hp[i]))
+
+    def in_region(self, x0, y0, x1, y1):
+        # Enemies with x0 <= x < x1 and y0 <= y < y1
+        if np is not None:
+            n = self.count
+            xs = self.xs[:n]
+            ys = self.ys[:n]
+            found = np.flatnonzero((xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1))
+            return [Enemy(int(xs[i]), int(ys[i]), int(self.hp[i])) for i in found]
+        # Probe the region's cells or filter all enemies, whichever is fewer
+        cells = self.cells
+        if (x1 - x0) * (y1 - y0) < self.count:
+            return [Enemy(x, y, self.hp[cells[(x, y)]])
+                    for y in range(y0, y1) for x in range(x0, x1) if (x, y) in cells]
+        return [Enemy(x, y, hp) for x, y, hp in zip(self.xs, self.ys, self.hp)
+                if x0 <= x < x1 and y0 <= y < y1]
+
+    def remove(self, enemy):
+        # Swap the last enemy into the freed slot
+        cells = self.cells
+        i = self.find(enemy.x, enemy.y)
+        last = self.count - 1
+        if cells is not None:
+            del cells[(enemy.x, enemy.y)]
+        if i != last:
+            self.xs[i] = self.xs[last]
+            self.ys[i] = self.ys[last]
+            self.hp[i] = self.hp[last]
+            if cells is not None:
+                cells[(int(self.xs[i]), int(self.ys[i]))] = i
+        if np is None:
+            del self.xs[last], self.ys[last], self.hp[last]
+        self.count = last
+
+    def step(self, i, targets, cells):
+        # Move enemy i to the first target cell nobody stands on, keeping
+        # the position -> index dict `cells` up to date
+        for x, y in targets:
+            if (x, y) not in cells:
+                del cells[(int(self.xs[i]), int(self.ys[i]))]
+                self.xs[i] = x
+                self.ys[i] = y
+                cells[(x, y)] = i
+                return True
+        return False
+
+    def tick(self, game_map, field=None, mode="wander", region=None):
+        self.ticks += 1
+        if not self.count:
+            return
+        chase = field is not None and mode != "wander"
+        if np is not None:
+            self.tick_arrays(game_map, field if chase else None, mode == "flee", region)
+        else:
+            self.tick_python(game_map, field if chase else None, mode == "flee", region)
+
+    def tick_python(self, game_map, field, flee, region):
+        xs, ys, cells = self.xs, self.ys, self.cells
+        width = game_map.width
+        height = game_map.height
+        x0, y0, x1, y1 = region or (0, 0, width, height)
+        far = isinstance(game_map, Grid)
+        get = game_map.get
+        getrandbits = random.getrandbits
+        for i in range(self.count):
+            x = xs[i]
+            y = ys[i]
+            if x0 <= x < x1 and y0 <= y < y1:
+                if field and self.step(i, field.steps(x, y, flee), cells):
+                    continue
+            elif not far or (i + self.ticks) % FAR_INTERVAL:
+                continue
+            dx, dy = STEPS[getrandbits(2)]
+            nx = x + dx
+            ny = y + dy
+            if 0 < nx < width - 1 and 0 < ny < height - 1 and (nx, ny) not in cells \
+                    and get(nx, ny) == FLOOR:
+                del cells[(x, y)]
+                xs[i] = nx
+                ys[i] = ny
+                cells[(nx, ny)] = i
+
+    def tick_arrays(self, game_map, field, flee, region):
+        self.cells = None   # Rebuilt on the next lookup that needs it
+        n = self.count
+        xs = self.xs[:n]
+        ys = self.ys[:n]
+        width = game_map.width
+        height = game_map.height
+        if region:
+            x0, y0, x1, y1 = region
+            near = (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+        else:
+            near = np.ones(n, bool)
+        grid = isinstance(game_map, Grid)
+        act = near | ((np.arange(n) + self.ticks) % FAR_INTERVAL == 0) if grid else near.copy()
+        if field:
+            # The few enemies near the player step along the field one by
+            # one, checked against the enemies within a step of the region
+            x0, y0, x1, y1 = region or (0, 0, width, height)
+            nearby = np.flatnonzero((xs >= x0 - 1) & (xs <= x1) & (ys >= y0 - 1) & (ys <= y1))
+            cells = dict(zip(zip(xs[nearby].tolist(), ys[nearby].tolist()), nearby.tolist()))
+            for i in np.flatnonzero(near).tolist():
+                if self.step(i, field.steps(int(xs[i]), int(ys[i]), flee), cells):
+                    act[i] = False
+        movers = np.flatnonzero(act)
+        if not len(movers):
+            return
+
+        rng = np.random.default_rng(random.getrandbits(64))
+        steps = np.array(STEPS, np.int32)[rng.integers(0, 4, len(movers))]
+        tx = xs[movers] + steps[:, 0]
+        ty = ys[movers] + steps[:, 1]
+        ok = (tx > 0) & (tx < width - 1) & (ty > 0) & (ty < height - 1)
+        movers, tx, ty = movers[ok], tx[ok], ty[ok]
+        if grid:
+            tiles = np.frombuffer(game_map.cells, np.uint8)
+            ok = tiles[ty.astype(np.int64) * width + tx] == FLOOR_CODE
+        else:
+            ok = np.array([game_map.get(x, y) == FLOOR for x, y in zip(tx.tolist(), ty.tolist())], bool)
+        movers, tx, ty = movers[ok], tx[ok], ty[ok]
+        # Not onto any enemy's current cell, and one mover per target cell
+        targets = ty.astype(np.int64) * width + tx
+        ok = ~np.isin(targets, ys.astype(np.int64) * width + xs)
+        movers, tx, ty, targets = movers[ok], tx[ok], ty[ok], targets[ok]
+        if not len(movers):
+            return
+        order = np.argsort(targets, kind="stable")
+        ordered = targets[order]
+        first = order[np.concatenate(([True], ordered[1:] != ordered[:-1]))]
+        xs[movers[first]] = tx[first]
+        ys[movers[first]] = ty[first]
+
+# Distance field: Dijkstra outward from the player over the tiles enemies
+# can walk on, out to AI_RADIUS steps. Every step costs 1, so Dijkstra is a
+# plain breadth-first search here. The field is only rebuilt when the
+# player moves or a tile changes (the map revision); every enemy then reads
+# its next step from it in O(1) instead of searching on its own.
+class DistanceField:
+    def __init__(self, radius=AI_RADIUS):
+        self.radius = radius
+        self.dist = {}
+        self.key = None
+
+    def update(self, game_map, player, revision):
+        key = (player.x, player.y, revision)
+        if key == self.key:
+            return False
+        self.key = key
+        width = game_map.width
+        height = game_map.height
+        start = (player.x, player.y)
+        dist = {start: 0}
+        queue = deque([start])
+        radius = self.radius
+        while queue:
+            cell = queue.popleft()
+            d = dist[cell]
+            if d == radius:
+                continue
+            x, y = cell
+            for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                if (nx, ny) not in dist and 0 < nx < width - 1 and 0 < ny < height - 1 \
+                        and game_map.get(nx, ny) == FLOOR:
+                    dist[(nx, ny)] = d + 1
+                    queue.append((nx, ny))
+        self.dist = dist
+        return True
+
+    def distance(self, x, y):
+        return self.dist.get((x, y))
+
+    def steps(self, x, y, flee=False):
+        # Neighbouring cells that bring an enemy closer to (or, fleeing,
+        # further from) the player, best first
+        here = self.dist.get((x, y))
+        if here is None:
+            return []
+        better = []
+        for cell in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            d = self.dist.get(cell)
+            if d is not None and (d > here if flee else d < here):
+                better.append((d, cell))
+        better.sort(reverse=flee)
+        return [cell for _, cell in better]
+
+# Field of view by recursive shadowcasting. Each of the eight octants is
+# scanned row by row outward from the player; a wall narrows the slope range
+# still in view and the rows beyond it recurse with the narrower range. The
+# visible set is cached per (player position, map revision), so standing
+# still or walking back over known ground is a dict lookup. `seen` remembers
+# every cell that has ever been visible, for drawing the fog dimmed.
+class FieldOfView:
+    # (xx, xy, yx, yy) transforms from octant to map coordinates
+    OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+               (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+    def __init__(self, radius=FOV_RADIUS, cache_size=FOV_CACHE):
+        self.radius = radius
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.revision = None
+        self.visible = set()
+        self.seen = set()
+
+    def update(self, game_map, player, revision):
+        if revision != self.revision:
+            # Tiles changed: every cached set may be stale
+            self.cache.clear()
+            self.revision = revision
+        key = (player.x, player.y)
+        visible = self.cache.get(key)
+        if visible is None:
+            visible = {key}
+            for xx, xy, yx, yy in self.OCTANTS:
+                self.cast(game_map, player.x, player.y, 1, 1.0, 0.0, xx, xy, yx, yy, visible)
+            self.seen |= visible
+            self.cache[key] = visible
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        self.visible = visible
+        return visible
+
+    def cast(self, game_map, cx, cy, row, start, end, xx, xy, yx, yy, visible):
+        if start < end:
+            return
+        radius = self.radius
+        radius_sq = radius * radius
+        width = game_map.width
+        height = game_map.height
+        new_start = start
+        for j in range(row, radius + 1):
+            dx = -j - 1
+            dy = -j
+            blocked = False
+            while dx <= 0:
+                dx += 1
+                # Slopes of the cell's left and right edges
+                left = (dx - 0.5) / (dy + 0.5)
+                right = (dx + 0.5) / (dy - 0.5)
+                if start < right:
+                    continue
+                if end > left:
                     break
+                x = cx + dx * xx + dy * xy
+                y = cy + dx * yx + dy * yy
+                inside = 0 <= x < width and 0 <= y < height
+                if inside and dx * dx + dy * dy <= radius_sq:
+                    visible.add((x, y))
+                opaque = not inside or game_map.get(x, y) == WALL
+                if blocked:
+                    if opaque:
+                        new_start = right
+                    else:
+                        blocked = False
+                        start = new_start
+                elif opaque and j < radius:
+                    blocked = True
+                    self.cast(game_map, cx, cy, j + 1, start, left, xx, xy, yx, yy, visible)
+                    new_start = right
+            if blocked:
+                break
+
+# Chunked world: a very large map stored as CHUNK_SIZE square chunks. A chunk
+# is generated from the world seed the first time it is touched, and the
+# least recently used chunks are dropped once more than CHUNK_CACHE are in
+# memory. Dropped chunks are regenerated identically on the next touch with
+# the world's tile edits (picked-up treasure, sprung traps) re-applied, so
+# memory depends on the cache size rather than the world size. Each chunk is
+# a Grid, and the world itself has the Grid interface.
+class ChunkedWorld:
+    def __init__(self, width, height, seed=0, cache_size=CHUNK_CACHE):
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.cache_size = cache_size
+        self.chunks = OrderedDict()
+        self.edits = {}             # (cx, cy) -> {(lx, ly): tile}
+        self.seen = set()           # Chunks whose enemies have been spawned
+        self.spawns = []            # Enemy positions waiting to be spawned
+        rng = random.Random(seed)
+        self.exit = (rng.randint(width // 2, width - 2), rng.randint(height // 2, height - 2))
+
+    def chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        chunk = self.generate_chunk(cx, cy)
+        for (lx, ly), tile in self.edits.get(key, {}).items():
+            chunk.set(lx, ly, tile)
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.cache_size:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def get(self, x, y):
+        cx, lx = divmod(x, CHUNK_SIZE)
+        cy, ly = divmod(y, CHUNK_SIZE)
+        return self.chunk(cx, cy).get(lx, ly)
 
-def draw_map(stdscr, game_map, player, enemies):
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            ch = game_map[y][x]
-            color = COLOR_DEFAULT
-            if ch == WALL:
-                color = COLOR_WALL
-            elif ch == FLOOR:
-                color = COLOR_FLOOR
-            elif ch == TREASURE:
-                color = COLOR_TREASURE
-            elif ch == TRAP:
-                color = COLOR_TRAP
-            elif ch == EXIT:
-                color = COLOR_EXIT
-            stdscr.addch(y+2, x, ch, curses.color_pair(color))
-    # Draw enemies
-    for enemy in enemies:
-        stdscr.addch(enemy.y+2, enemy.x, ENEMY_CHAR, curses.color_pair(COLOR_ENEMY))
-    # Draw player
-    stdscr.addch(player.y+2, player.x, PLAYER_CHAR, curses.color_pair(COLOR_PLAYER))
-
-def update_status(stdscr, player):
-    status = f"HP: {player.hp} | Gold: {player.gold} | Inventory: {player.inventory}"
+    def set(self, x, y, tile):
+        cx, lx = divmod(x, CHUNK_SIZE)
+        cy, ly = divmod(y, CHUNK_SIZE)
+        self.chunk(cx, cy).set(lx, ly, tile)
+        self.edits.setdefault((cx, cy), {})[(lx, ly)] = tile
+
+    def neighbours(self, x, y):
+        for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                yield nx, ny
+
+    def row(self, y, x0=0, x1=None):
+        # Stitched together from the slices of every chunk the span crosses
+        x1 = self.width if x1 is None else x1
+        cy, ly = divmod(y, CHUNK_SIZE)
+        parts = []
+        x = x0
+        while x < x1:
+            cx, lx = divmod(x, CHUNK_SIZE)
+            end = min(CHUNK_SIZE, lx + x1 - x)
+            parts.append(self.chunk(cx, cy).row(ly, lx, end))
+            x += end - lx
+        return "".join(parts)
+
+    def touch(self, x0, y0, x1, y1):
+        # Make sure every chunk overlapping the region has been generated
+        for cy in range(max(y0, 0) // CHUNK_SIZE, (min(y1, self.height) - 1) // CHUNK_SIZE + 1):
+            for cx in range(max(x0, 0) // CHUNK_SIZE, (min(x1, self.width) - 1) // CHUNK_SIZE + 1):
+                self.chunk(cx, cy)
+
+    def take_spawns(self):
+        spawns = self.spawns
+        self.spawns = []
+        return spawns
+
+    def generate_chunk(self, cx, cy):
+        # Same densities as generate_map; cells outside the world are walls
+        rng = random.Random((self.seed << 42) ^ (cx << 21) ^ cy)
+        x0 = cx * CHUNK_SIZE
+        y0 = cy * CHUNK_SIZE
+        chunk = Grid(CHUNK_SIZE, CHUNK_SIZE, WALL)
+        # The part of the chunk inside the world's border is floor
+        lx0 = min(max(1 - x0, 0), CHUNK_SIZE)
+        ly0 = min(max(1 - y0, 0), CHUNK_SIZE)
+        lx1 = max(min(self.width - 1 - x0, CHUNK_SIZE), lx0)
+        ly1 = max(min(self.height - 1 - y0, CHUNK_SIZE), ly0)
+        chunk.fill(lx0, ly0, lx1, ly1, FLOOR)
+        area = CHUNK_SIZE * CHUNK_SIZE
+        for tile, count in MAP_FEATURES:
+            floor_only = tile != WALL
+            for _ in range(count * area // CLASSIC_AREA):
+                lx = rng.randrange(CHUNK_SIZE)
+                ly = rng.randrange(CHUNK_SIZE)
+                here = chunk.get(lx, ly)
+                if here == FLOOR or (not floor_only and here != WALL):
+                    chunk.set(lx, ly, tile)
+        # Keep the player's start open and place the world's single exit
+        for (x, y), tile in (((1, 1), FLOOR), (self.exit, EXIT)):
+            if x // CHUNK_SIZE == cx and y // CHUNK_SIZE == cy:
+                chunk.set(x - x0, y - y0, tile)
+        # Enemies become Enemy objects, spawned only the first time
+        first_visit = (cx, cy) not in self.seen
+        self.seen.add((cx, cy))
+        for lx, ly in list(chunk.find_all(ENEMY_CHAR)):
+            chunk.set(lx, ly, FLOOR)
+            if first_visit:
+                self.spawns.append((x0 + lx, y0 + ly))
+        return chunk
+
+# Camera: the MAP_WIDTH x MAP_HEIGHT window of the map that is drawn,
+# centred on the player and clamped to the map edges
+class Camera:
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+
+    def follow(self, player, game_map):
+        map_width = game_map.width
+        map_height = game_map.height
+        self.x = min(max(player.x - self.width // 2, 0), max(map_width - self.width, 0))
+        self.y = min(max(player.y - self.height // 2, 0), max(map_height - self.height, 0))
+
+    def region(self, margin=0):
+        # (x0, y0, x1, y1) of the view grown by margin cells on every side
+        return (self.x - margin, self.y - margin,
+                self.x + self.width + margin, self.y + self.height + margin)
+
+def build_color_table():
+    # Curses attribute per map glyph (needs init_colors first)
+    return {
+        WALL: curses.color_pair(COLOR_WALL),
+        FLOOR: curses.color_pair(COLOR_FLOOR),
+        TREASURE: curses.color_pair(COLOR_TREASURE),
+        TRAP: curses.color_pair(COLOR_TRAP),
+        EXIT: curses.color_pair(COLOR_EXIT),
+        STAIRS_UP: curses.color_pair(COLOR_EXIT),
+        ENEMY_CHAR: curses.color_pair(COLOR_ENEMY),
+        PLAYER_CHAR: curses.color_pair(COLOR_PLAYER),
+    }
+
+# Incremental renderer: keeps the glyph last drawn in every cell of the view
+# and redraws only what changed. Between frames that is the cells enemies
+# and the player left or entered plus tiles marked dirty (pickups, traps);
+# when the camera scrolls, every view cell is compared and only differing
+# ones are drawn. bytes_last_frame estimates the terminal output those
+# writes cost (glyphs, cursor jumps and colour changes).
+#
+# With a FieldOfView the renderer draws fog of war: visible cells as usual,
+# cells seen before as dimmed terrain without enemies, and the rest blank.
+# Only cells entering or leaving the visible set are revisited between
+# frames, so a still player costs the same as without fog.
+class MapRenderer:
+    def __init__(self, win, width=MAP_WIDTH, height=MAP_HEIGHT, top=2):
+        self.win = win
+        self.width = width
+        self.height = height
+        self.top = top
+        self.colors = build_color_table()
+        self.default_color = curses.color_pair(COLOR_DEFAULT)
+        self.dim_colors = {ch: attr | curses.A_DIM for ch, attr in self.colors.items()}
+        self.bytes_last_frame = 0
+        self.cells_last_frame = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self.front = [[None] * self.width for _ in range(self.height)]
+        self.overlay = {}
+        self.dirty = set()
+        self.origin = None
+        self.lit = set()
+
+    def mark(self, x, y):
+        # A map tile changed at (x, y) in map coordinates
+        self.dirty.add((x, y))
+
+    def draw(self, game_map, player, enemies, camera, fov=None):
+        cam_x, cam_y = camera.x, camera.y
+        view_width = min(self.width, game_map.width)
+        view_height = min(self.height, game_map.height)
+        visible = fov.visible if fov else None
+        overlay = {(enemy.x - cam_x, enemy.y - cam_y): ENEMY_CHAR
+                   for enemy in enemies.in_region(cam_x, cam_y, cam_x + view_width, cam_y + view_height)
+                   if visible is None or (enemy.x, enemy.y) in visible}
+        overlay[(player.x - cam_x, player.y - cam_y)] = PLAYER_CHAR
+        if self.origin != (cam_x, cam_y):
+            cells = [(sx, sy) for sy in range(view_height) for sx in range(view_width)]
+            self.origin = (cam_x, cam_y)
+        else:
+            cells = set(self.overlay)
+            cells.update(overlay)
+            cells.update((x - cam_x, y - cam_y) for x, y in self.dirty)
+            if visible is not None and visible is not self.lit:
+                cells.update((x - cam_x, y - cam_y) for x, y in visible ^ self.lit)
+            # Row-major order keeps the estimated cursor jumps realistic
+            cells = sorted((sx, sy) for sx, sy in cells
+                           if 0 <= sx < view_width and 0 <= sy < view_height)
+            cells.sort(key=lambda cell: cell[1])
+        self.overlay = overlay
+        self.dirty.clear()
+        self.lit = visible if visible is not None else set()
+        seen = fov.seen if fov else None
+        dim_colors = self.dim_colors
+
+        rows = [game_map.row(cam_y + sy, cam_x, cam_x + view_width) for sy in range(view_height)]
+        win = self.win
+        front = self.front
+        colors = self.colors
+        default_color = self.default_color
+        written = 0
+        out_bytes = 0
+        cursor = None
+        last_attr = None
+        for sx, sy in cells:
+            if visible is None or (cam_x + sx, cam_y + sy) in visible:
+                ch = overlay.get((sx, sy)) or rows[sy][sx]
+                attr = colors.get(ch, default_color)
+            elif (cam_x + sx, cam_y + sy) in seen:
+                ch = rows[sy][sx]
+                attr = dim_colors.get(ch, default_color)
+            else:
+                ch = " "
+                attr = default_color
+            if front[sy][sx] == (ch, attr):
+                continue
+            front[sy][sx] = (ch, attr)
+            win.addch(sy + self.top, sx, ch, attr)
+            written += 1
+            # Estimate the escape sequences curses needs for this cell
+            if cursor != (sx, sy):
+                out_bytes += len(f"\x1b[{sy + self.top + 1};{sx + 1}H")
+            if attr != last_attr:
+                out_bytes += 8
+                last_attr = attr
+            out_bytes += len(ch.encode())
+            cursor = (sx + 1, sy)
+        self.cells_last_frame = written
+        self.bytes_last_frame = out_bytes
+        win.noutrefresh()
+
+def update_status(stdscr, player, depth=0, renderer=None):
+    status = f"Depth: {depth + 1} | HP: {player.hp} | Gold: {player.gold} | Inventory: {player.inventory}"
+    if renderer:
+        status += f" | Drawn: {renderer.cells_last_frame} cells, ~{renderer.bytes_last_frame} B"
     stdscr.addstr(0, 0, status, curses.color_pair(COLOR_DEFAULT))
     stdscr.clrtoeol()
 
-def trigger_treasure(player, stdscr):
+# Event queue: timed callbacks and expiring status messages. Nothing here
+# sleeps: the main loop calls run_due() once per frame and draw() to repaint
+# the message rows, so a battle or a "You found..." line plays out while
+# input and redraws keep going. The clock is injectable so a replay can run
+# on virtual time.
+class EventQueue:
+    def __init__(self, clock=time.monotonic, top=MAP_HEIGHT + 3, lines=MESSAGE_LINES):
+        self.clock = clock
+        self.top = top
+        self.heap = []
+        self.seq = 0  # Tie-breaker so equal deadlines run in schedule order
+        self.messages = [None] * lines  # (text, color, expires) per row
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, delay, callback):
+        heapq.heappush(self.heap, (self.clock() + delay, self.seq, callback))
+        self.seq += 1
+
+    def post(self, line, text, color, duration=MESSAGE_TIME):
+        # duration=None keeps the message until that line is posted again
+        expires = None if duration is None else self.clock() + duration
+        self.messages[line] = (text, color, expires)
+        self.dirty = True
+
+    def clear(self, line):
+        if self.messages[line]:
+            self.messages[line] = None
+            self.dirty = True
+
+    def run_due(self):
+        now = self.clock()
+        while self.heap and self.heap[0][0] <= now:
+            callback = heapq.heappop(self.heap)[2]
+            callback()
+        for line, message in enumerate(self.messages):
+            if message and message[2] is not None and message[2] <= now:
+                self.clear(line)
+
+    def draw(self, stdscr):
+        if not self.dirty:
+            return
+        for line, message in enumerate(self.messages):
+            stdscr.move(self.top + line, 0)
+            stdscr.clrtoeol()
+            if message:
+                stdscr.addstr(self.top + line, 0, message[0], curses.color_pair(message[1]))
+        stdscr.noutrefresh()
+        self.dirty = False
+
+def trigger_treasure(player, events):
     gold = random.randint(10, 50)
     player.gold += gold
-    stdscr.addstr(MAP_HEIGHT+3, 0, f"You found treasure! Gold +{gold}.", curses.color_pair(COLOR_TREASURE))
-    stdscr.refresh()
-    time.sleep(1)
+    events.post(0, f"You found treasure! Gold +{gold}.", COLOR_TREASURE)
 
-def trigger_trap(player, stdscr):
+def trigger_trap(player, events):
     damage = random.randint(10, 30)
     player.hp -= damage
-    stdscr.addstr(MAP_HEIGHT+3, 0, f"Ouch! A trap dealt {damage} damage.", curses.color_pair(COLOR_TRAP))
-    stdscr.refresh()
-    time.sleep(1)
-
-def battle(player, enemy, stdscr):
-    stdscr.addstr(MAP_HEIGHT+3, 0, f"An enemy attacks! [Battle Started]", curses.color_pair(COLOR_ENEMY))
-    stdscr.refresh()
-    time.sleep(1)
-    while enemy.hp > 0 and player.hp > 0:
-        # Player attack
+    events.post(0, f"Ouch! A trap dealt {damage} damage.", COLOR_TRAP)
+
+# A fight played out one round per scheduled event. The player is locked in
+# place until done; the main loop keeps running and checks player.hp
+# afterwards to tell a win from a defeat.
+class Battle:
+    def __init__(self, player, enemy, events):
+        self.player = player
+        self.enemy = enemy
+        self.events = events
+        self.done = False
+        events.post(0, "An enemy attacks! [Battle Started]", COLOR_ENEMY, None)
+        events.schedule(1.0, self.player_turn)
+
+    def player_turn(self):
         damage = random.randint(10, 20)
-        enemy.hp -= damage
-        stdscr.addstr(MAP_HEIGHT+4, 0, f"You hit for {damage} damage. Enemy HP: {max(enemy.hp,0)}   ", curses.color_pair(COLOR_PLAYER))
-        stdscr.refresh()
-        time.sleep(0.8)
-        if enemy.hp <= 0:
-            break
-        # Enemy attack
+        self.enemy.hp -= damage
+        self.events.post(1, f"You hit for {damage} damage. Enemy HP: {max(self.enemy.hp, 0)}", COLOR_PLAYER, None)
+        if self.enemy.hp <= 0:
+            self.events.schedule(ROUND_DELAY, self.finish)
+        else:
+            self.events.schedule(ROUND_DELAY, self.enemy_turn)
+
+    def enemy_turn(self):
         enemy_damage = random.randint(5, 15)
-        player.hp -= enemy_damage
-        stdscr.addstr(MAP_HEIGHT+5, 0, f"Enemy hits you for {enemy_damage} damage. Your HP: {player.hp}   ", curses.color_pair(COLOR_ENEMY))
-        stdscr.refresh()
-        time.sleep(0.8)
-    if player.hp <= 0:
-        stdscr.addstr(MAP_HEIGHT+6, 0, "You were defeated! Game Over. Press any key.", curses.color_pair(COLOR_TRAP))
-        stdscr.refresh()
-        stdscr.getch()
-        exit()
+        self.player.hp -= enemy_damage
+        self.events.post(2, f"Enemy hits you for {enemy_damage} damage. Your HP: {self.player.hp}", COLOR_ENEMY, None)
+        if self.player.hp <= 0:
+            self.events.schedule(ROUND_DELAY, self.finish)
+        else:
+            self.events.schedule(ROUND_DELAY, self.player_turn)
+
+    def finish(self):
+        for line in range(3):
+            self.events.clear(line)
+        if self.player.hp <= 0:
+            self.events.post(3, "You were defeated! Game Over. Press any key.", COLOR_TRAP, None)
+        else:
+            gold = random.randint(20, 40)
+            self.player.gold += gold
+            self.events.post(3, f"Enemy defeated! You earn {gold} gold.", COLOR_TREASURE)
+        self.done = True
+
+def trigger_exit(player, events):
+    events.post(0, "You found the exit! Escaping...", COLOR_EXIT, None)
+    events.schedule(2.0, lambda: events.post(
+        1, f"Congrats! You escaped with {player.gold} gold and {player.hp} HP. Press any key.", COLOR_EXIT, None))
+
+# --- Levels and save games ---
+# Levels are packed as a fixed header followed by variable-length sections,
+# all little-endian:
+#   header     map kind, map size, map revision, the stairs down and the
+#              enemy count
+#   enemies    x, y, hp (i) per enemy, packed as one block
+#   map        MAP_GRID: the raw Grid bytes. MAP_WORLD: the world seed plus
+#              its visited chunks, tile edits and pending spawns; the
+#              chunks themselves are regenerated from the seed
+# The same bytes are what an evicted level spills to disk.
+#
+# A save is a header (player, depth, dungeon seed and shape), the
+# inventory as name length (B) / UTF-8 name / count (i) entries, the enemy
+# of a fight in progress (a flag, then x, y, hp; it is off the board while
+# the fight lasts), the Mersenne Twister state of the `random` module,
+# every generated level
+# as depth (H) / length (I) / packed level, and a CRC-32 trailer. Saves
+# are written to a temporary name and renamed over the old one, so a crash
+# mid-write never leaves a torn save, and read back through mmap.
+SAVE_MAGIC = b"TQSV"
+SAVE_VERSION = 3
+SAVE_HEADER = struct.Struct("<4sBiiiiHHqIIHH")
+LEVEL_HEADER = struct.Struct("<BIIIiiI")
+LEVEL_ENTRY = struct.Struct("<HI")
+MAP_GRID = 0
+MAP_WORLD = 1
+ITEM_COUNT = struct.Struct("<i")
+FIGHT = struct.Struct("<Biii")
+RNG_STATE = struct.Struct("<B625IBd")
+WORLD_HEADER = struct.Struct("<qIII")
+CELL = struct.Struct("<ii")
+TILE_EDIT = struct.Struct("<iiBBc")
+SAVE_TRAILER = struct.Struct("<I")
+AUTOSAVE_TICKS = 100
+
+def pack_level(level):
+    game_map = level.game_map
+    world = isinstance(game_map, ChunkedWorld)
+    enemy_count = len(level.enemies)
+    out = bytearray(LEVEL_HEADER.pack(
+        MAP_WORLD if world else MAP_GRID, game_map.width, game_map.height,
+        level.revision, *level.down, enemy_count,
+    ))
+    out += struct.pack(f"<{3 * enemy_count}i",
+                       *[v for enemy in zip(*level.enemies.columns()) for v in enemy])
+    if world:
+        edits = [(cx, cy, lx, ly, tile.encode("ascii"))
+                 for (cx, cy), cells in game_map.edits.items()
+                 for (lx, ly), tile in cells.items()]
+        out += WORLD_HEADER.pack(game_map.seed, len(game_map.seen), len(edits), len(game_map.spawns))
+        for cell in sorted(game_map.seen):
+            out += CELL.pack(*cell)
+        for edit in edits:
+            out += TILE_EDIT.pack(*edit)
+        for cell in game_map.spawns:
+            out += CELL.pack(*cell)
     else:
-        gold = random.randint(20, 40)
-        player.gold += gold
-        stdscr.addstr(MAP_HEIGHT+6, 0, f"Enemy defeated! You earn {gold} gold.             ", curses.color_pair(COLOR_TREASURE))
-        stdscr.refresh()
-        time.sleep(1)
-
-def trigger_exit(player, stdscr):
-    stdscr.addstr(MAP_HEIGHT+3, 0, "You found the exit! Escaping...", curses.color_pair(COLOR_EXIT))
-    stdscr.refresh()
-    time.sleep(2)
-    stdscr.addstr(MAP_HEIGHT+4, 0, f"Congrats! You escaped with {player.gold} gold and {player.hp} HP. Press any key.", curses.color_pair(COLOR_EXIT))
-    stdscr.refresh()
-    stdscr.getch()
-    exit()
-
-def main(stdscr):
-    curses.curs_set(0)
-    stdscr.nodelay(True)
-    stdscr.timeout(150)
-    init_colors()
+        out += game_map.cells
+    return out
 
-    game_map = generate_map()
-    player = Player(1, 1)
-
-    # Initialize enemies based on map positions
-    enemies = []
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            if game_map[y][x] == ENEMY_CHAR:
-                enemies.append(Enemy(x, y))
-                # Clear enemy tile from map to avoid duplicate drawing
-                game_map[y][x] = FLOOR
-
-    while True:
-        stdscr.clear()
-        update_status(stdscr, player)
-        draw_map(stdscr, game_map, player, enemies)
-        stdscr.refresh()
-
-        key = stdscr.getch()
-        if key == curses.KEY_UP:
-            player.move(0, -1, game_map)
-        elif key == curses.KEY_DOWN:
-            player.move(0, 1, game_map)
-        elif key == curses.KEY_LEFT:
-            player.move(-1, 0, game_map)
-        elif key == curses.KEY_RIGHT:
-            player.move(1, 0, game_map)
-        elif key == ord('q'):
-            break
+def unpack_level(data, pos=0):
+    # Returns (level, position after it)
+    kind, width, height, revision, down_x, down_y, enemy_count = LEVEL_HEADER.unpack_from(data, pos)
+    pos += LEVEL_HEADER.size
+    enemies = EnemyManager()
+    values = struct.unpack_from(f"<{3 * enemy_count}i", data, pos)
+    pos += 12 * enemy_count
+    for i in range(0, len(values), 3):
+        enemies.add(Enemy(values[i], values[i + 1], values[i + 2]))
+    if kind == MAP_WORLD:
+        seed, seen_count, edit_count, spawn_count = WORLD_HEADER.unpack_from(data, pos)
+        pos += WORLD_HEADER.size
+        game_map = ChunkedWorld(width, height, seed=seed)
+        for _ in range(seen_count):
+            game_map.seen.add(CELL.unpack_from(data, pos))
+            pos += CELL.size
+        for _ in range(edit_count):
+            cx, cy, lx, ly, tile = TILE_EDIT.unpack_from(data, pos)
+            game_map.edits.setdefault((cx, cy), {})[(lx, ly)] = tile.decode("ascii")
+            pos += TILE_EDIT.size
+        for _ in range(spawn_count):
+            game_map.spawns.append(CELL.unpack_from(data, pos))
+            pos += CELL.size
+    elif kind == MAP_GRID:
+        game_map = Grid(width, height)
+        game_map.restore(data[pos:pos + width * height])
+        pos += width * height
+    else:
+        raise ValueError(f"unknown map kind {kind}")
+    return Level(game_map, enemies, (down_x, down_y), revision), pos
+
+class Level:
+    def __init__(self, game_map, enemies, down, revision=0):
+        self.game_map = game_map
+        self.enemies = enemies
+        self.down = down            # Position of the stairs down (the EXIT tile)
+        self.revision = revision    # Bumped whenever a tile changes
+
+    def nbytes(self):
+        # Rough resident size, for the level cache's memory cap
+        game_map = self.game_map
+        if isinstance(game_map, ChunkedWorld):
+            size = len(game_map.chunks) * CHUNK_SIZE * CHUNK_SIZE
+            size += TILE_EDIT.size * sum(len(cells) for cells in game_map.edits.values())
+        else:
+            size = len(game_map.cells)
+        return size + ENEMY_BYTES * len(self.enemies)
+
+# The dungeon: DUNGEON_DEPTH levels, each generated from the dungeon seed
+# and its depth the first time it is entered. Levels stay in an LRU cache
+# until their combined size passes cache_bytes; the least recently used
+# ones are then packed and spilled to files in a scratch directory and
+# unpacked from there when the player comes back, so a level returns
+# exactly as it was left.
+class Dungeon:
+    def __init__(self, seed, world_size=None, depth_count=DUNGEON_DEPTH,
+                 cache_bytes=LEVEL_CACHE_BYTES):
+        self.seed = seed
+        self.world_size = world_size
+        self.depth_count = depth_count
+        self.cache_bytes = cache_bytes
+        self.levels = OrderedDict()     # depth -> Level, least recent first
+        self.spilled = {}               # depth -> path of its packed level
+        self.directory = None
+
+    def level_seed(self, depth):
+        return self.seed * 1_000_003 + depth
+
+    def generate(self, depth):
+        if self.world_size:
+            # Chunks (and their enemies) appear as the camera reaches them
+            game_map = ChunkedWorld(*self.world_size, seed=self.level_seed(depth))
+            enemies = EnemyManager()
+            down = game_map.exit
+        else:
+            game_map = generate_map(seed=self.level_seed(depth))
+            enemies = EnemyManager()
+            # Clear enemy tiles from the map to avoid duplicate drawing
+            for x, y in list(game_map.find_all(ENEMY_CHAR)):
+                enemies.add(Enemy(x, y))
+                game_map.set(x, y, FLOOR)
+            down = next(game_map.find_all(EXIT))
+        if depth > 0:
+            game_map.set(1, 1, STAIRS_UP)
+        return Level(game_map, enemies, down)
+
+    def generated(self):
+        # Depths of every level generated so far, in memory or on disk
+        return sorted(set(self.levels) | set(self.spilled))
+
+    def level(self, depth):
+        level = self.levels.get(depth)
+        if level is not None:
+            self.levels.move_to_end(depth)
+            return level
+        path = self.spilled.pop(depth, None)
+        if path:
+            with open(path, "rb") as f:
+                level = unpack_level(f.read())[0]
+            os.remove(path)
+        else:
+            level = self.generate(depth)
+        self.levels[depth] = level
+        self.evict()
+        return level
+
+    def packed(self, depth):
+        # A level's packed bytes without bringing it back into memory
+        if depth in self.levels:
+            return pack_level(self.levels[depth])
+        with open(self.spilled[depth], "rb") as f:
+            return f.read()
+
+    def evict(self):
+        # Spill least recently used levels, never the current (newest) one
+        total = sum(level.nbytes() for level in self.levels.values())
+        while total > self.cache_bytes and len(self.levels) > 1:
+            depth, level = self.levels.popitem(last=False)
+            total -= level.nbytes()
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix="termiquest-")
+            path = os.path.join(self.directory, f"level-{depth}.bin")
+            with open(path, "wb") as f:
+                f.write(pack_level(level))
+            self.spilled[depth] = path
+
+    def close(self):
+        for path in self.spilled.values():
+            os.remove(path)
+        self.spilled.clear()
+        if self.directory:
+            os.rmdir(self.directory)
+            self.directory = None
+
+def save_game(path, dungeon, player, depth, fight_enemy=None):
+    world_width, world_height = dungeon.world_size or (0, 0)
+    depths = dungeon.generated()
+    out = bytearray(SAVE_HEADER.pack(
+        SAVE_MAGIC, SAVE_VERSION, player.x, player.y, player.hp, player.gold,
+        depth, dungeon.depth_count, dungeon.seed, world_width, world_height,
+        len(player.inventory), len(depths),
+    ))
+    for item, count in player.inventory.items():
+        name = item.encode()
+        out.append(len(name))
+        out += name
+        out += ITEM_COUNT.pack(count)
+    if fight_enemy:
+        out += FIGHT.pack(1, fight_enemy.x, fight_enemy.y, fight_enemy.hp)
+    else:
+        out += FIGHT.pack(0, 0, 0, 0)
+    version, state, gauss_next = random.getstate()
+    out += RNG_STATE.pack(version, *state, gauss_next is not None, gauss_next or 0.0)
+    for level_depth in depths:
+        packed = dungeon.packed(level_depth)
+        out += LEVEL_ENTRY.pack(level_depth, len(packed))
+        out += packed
+    out += SAVE_TRAILER.pack(zlib.crc32(out))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(out)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(out)
+
+def load_game(path):
+    # Returns (dungeon, player, depth, enemy of the fight in progress or
+    # None) and restores the RNG
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < SAVE_HEADER.size + SAVE_TRAILER.size:
+            raise ValueError(f"{path}: not a TermiQuest save")
+        (magic, version, x, y, hp, gold, depth, depth_count, seed,
+         world_width, world_height, item_count, level_count) = SAVE_HEADER.unpack_from(data, 0)
+        if magic != SAVE_MAGIC:
+            raise ValueError(f"{path}: not a TermiQuest save")
+        if version != SAVE_VERSION:
+            raise ValueError(f"{path}: unsupported save version {version}")
+        body_end = len(data) - SAVE_TRAILER.size
+        (crc,) = SAVE_TRAILER.unpack_from(data, body_end)
+        if zlib.crc32(data[:body_end]) != crc:
+            raise ValueError(f"{path}: save is corrupt")
+
+        player = Player(x, y)
+        player.hp = hp
+        player.gold = gold
+        player.inventory = {}
+        pos = SAVE_HEADER.size
+        for _ in range(item_count):
+            size = data[pos]
+            name = data[pos + 1:pos + 1 + size].decode()
+            pos += 1 + size
+            (player.inventory[name],) = ITEM_COUNT.unpack_from(data, pos)
+            pos += ITEM_COUNT.size
+
+        fighting, enemy_x, enemy_y, enemy_hp = FIGHT.unpack_from(data, pos)
+        pos += FIGHT.size
+        fight_enemy = Enemy(enemy_x, enemy_y, enemy_hp) if fighting else None
+
+        rng_version, *state, has_gauss, gauss_next = RNG_STATE.unpack_from(data, pos)
+        pos += RNG_STATE.size
+        random.setstate((rng_version, tuple(state), gauss_next if has_gauss else None))
+
+        world_size = (world_width, world_height) if world_width else None
+        dungeon = Dungeon(seed, world_size, depth_count)
+        for _ in range(level_count):
+            level_depth, _ = LEVEL_ENTRY.unpack_from(data, pos)
+            level, pos = unpack_level(data, pos + LEVEL_ENTRY.size)
+            dungeon.levels[level_depth] = level
+    # Make the current level the most recent before trimming to the cap
+    dungeon.levels.move_to_end(depth)
+    dungeon.evict()
+    return dungeon, player, depth, fight_enemy
+
+# The game proper, without the terminal: begin_frame() runs due events and
+# handle(key) applies one frame's key code (-1 for none). Game time is the
+# frame count times FRAME_TIME rather than the wall clock, so a session
+# replays identically from its seed and key stream.
+class Game:
+    def __init__(self, seed=None, world_size=None, fog=False, renderer=None,
+                 save_path=None, load_path=None, autosave=AUTOSAVE_TICKS, ai=ENEMY_AI):
+        self.fog = fog
+        self.ai = ai
+        self.renderer = renderer
+        self.save_path = save_path
+        self.autosave = autosave
+        self.camera = Camera()
+        self.frames = 0
+        self.events = EventQueue(clock=self.clock)
+        self.fight = None       # Battle in progress, if any
+        self.game_over = False  # Set on death or escape; the world stops and any key quits
+        self.tick = 0
+        fight_enemy = None
+        if load_path:
+            self.dungeon, self.player, depth, fight_enemy = load_game(load_path)
+            self.seed = self.dungeon.seed
+            self.save_path = save_path or load_path
+        else:
+            self.seed = random.getrandbits(32) if seed is None else seed
+            random.seed(self.seed)
+            self.dungeon = Dungeon(self.seed, world_size)
+            self.player = Player(1, 1)
+            depth = 0
+        self.enter(depth)
+        if fight_enemy:
+            # A save taken mid-fight restarts that fight
+            self.fight = Battle(self.player, fight_enemy, self.events)
+
+    def clock(self):
+        return self.frames * FRAME_TIME
 
-        # Enemy AI: each enemy moves randomly
-        for enemy in enemies:
-            enemy.move_random(game_map)
+    def enter(self, depth):
+        # Switch levels; per-level caches start over on the new map
+        self.depth = depth
+        self.level = self.dungeon.level(depth)
+        self.game_map = self.level.game_map
+        self.enemies = self.level.enemies
+        self.world = self.game_map if isinstance(self.game_map, ChunkedWorld) else None
+        self.field = DistanceField()
+        self.fov = FieldOfView() if self.fog else None
+        if self.renderer:
+            self.renderer.invalidate()
 
-        # Check for collisions and events
-        current_tile = game_map[player.y][player.x]
+    def save(self):
+        # A battle's enemy is off the board until the fight ends, and another
+        # enemy may have stepped onto its cell, so it is saved on its own
+        fight_enemy = self.fight.enemy if self.fight and not self.fight.done else None
+        save_game(self.save_path, self.dungeon, self.player, self.depth, fight_enemy)
+
+    def close(self):
+        self.dungeon.close()
+
+    def begin_frame(self):
+        self.frames += 1
+        self.events.run_due()
+        if self.fight and self.fight.done:
+            self.fight = None
+            self.game_over = self.player.hp <= 0
+        self.camera.follow(self.player, self.game_map)
+        if self.world:
+            # Generate what the camera shows here rather than on first draw,
+            # so enemies spawn on the same frame with or without a renderer
+            self.world.touch(*self.camera.region())
+        if self.fov:
+            self.fov.update(self.game_map, self.player, self.level.revision)
+
+    def mark(self, x, y):
+        if self.renderer:
+            self.renderer.mark(x, y)
+
+    def handle(self, key):
+        # Returns False once the game should end
+        player = self.player
+        game_map = self.game_map
+        enemies = self.enemies
+        events = self.events
+        if key == ord('q'):
+            if self.save_path and not self.game_over:
+                self.save()
+            return False
+        if key == ord('s') and self.save_path and not self.game_over:
+            self.save()
+            events.post(0, f"Game saved to {self.save_path}.", COLOR_DEFAULT)
+        if self.game_over:
+            # Wait for the final message to be up, then any key quits
+            return key == -1 or bool(events)
+
+        position = (player.x, player.y)
+        if self.fight is None:
+            if key == curses.KEY_UP:
+                player.move(0, -1, game_map)
+            elif key == curses.KEY_DOWN:
+                player.move(0, 1, game_map)
+            elif key == curses.KEY_LEFT:
+                player.move(-1, 0, game_map)
+            elif key == curses.KEY_RIGHT:
+                player.move(1, 0, game_map)
+        moved = (player.x, player.y) != position
+
+        # Enemy AI: enemies near the player follow the shared distance field,
+        # the rest move randomly, and none walk onto another enemy
+        if self.world:
+            for x, y in self.world.take_spawns():
+                enemies.add(Enemy(x, y))
+        if self.ai != "wander":
+            self.field.update(game_map, player, self.level.revision)
+        # Only enemies near the view move every tick
+        enemies.tick(game_map, self.field, self.ai, self.camera.region(AI_RADIUS))
+
+        self.tick += 1
+        if self.save_path and self.autosave and self.tick % self.autosave == 0 and not self.fight:
+            self.save()
+
+        if self.fight:
+            return True
+
+        # Check for collisions and events. Stairs only fire when stepped
+        # onto, so arriving on a staircase does not bounce straight back
+        current_tile = game_map.get(player.x, player.y)
         if current_tile == TREASURE:
-            trigger_treasure(player, stdscr)
-            game_map[player.y][player.x] = FLOOR
+            trigger_treasure(player, events)
+            game_map.set(player.x, player.y, FLOOR)
+            self.level.revision += 1
+            self.mark(player.x, player.y)
         elif current_tile == TRAP:
-            trigger_trap(player, stdscr)
-            game_map[player.y][player.x] = FLOOR
-        elif current_tile == EXIT:
-            trigger_exit(player, stdscr)
-
-        # Check for enemy collision (battle trigger)
-        for enemy in enemies:
-            if enemy.x == player.x and enemy.y == player.y:
-                battle(player, enemy, stdscr)
-                # Remove enemy after battle
-                enemies.remove(enemy)
-                break
+            trigger_trap(player, events)
+            game_map.set(player.x, player.y, FLOOR)
+            self.level.revision += 1
+            self.mark(player.x, player.y)
+        elif current_tile == EXIT and moved:
+            if self.depth + 1 < self.dungeon.depth_count:
+                self.enter(self.depth + 1)
+                player.x, player.y = 1, 1
+                events.post(0, f"You descend to depth {self.depth + 1}.", COLOR_EXIT)
+            else:
+                trigger_exit(player, events)
+                self.game_over = True
+        elif current_tile == STAIRS_UP and moved:
+            self.enter(self.depth - 1)
+            player.x, player.y = self.level.down
+            events.post(0, f"You climb back up to depth {self.depth + 1}.", COLOR_EXIT)
+
+        # Check for enemy collision (battle trigger). The enemy leaves the
+        # board now; the player glyph covers its cell for the whole fight
+        enemy = self.enemies.at(player.x, player.y)
+        if enemy and not self.game_over:
+            self.enemies.remove(enemy)
+            self.fight = Battle(player, enemy, events)
 
         # Player death check
-        if player.hp <= 0:
-            stdscr.addstr(MAP_HEIGHT+3, 0, "You have perished in the dungeon... Game Over. Press any key.", curses.color_pair(COLOR_TRAP))
-            stdscr.refresh()
-            stdscr.getch()
+        if player.hp <= 0 and not self.game_over and self.fight is None:
+            events.post(0, "You have perished in the dungeon... Game Over. Press any key.", COLOR_TRAP, None)
+            self.game_over = True
+        return True
+
+    def digest(self):
+        # Summary of the final state that a replay is checked against
+        player = self.player
+        crc = zlib.crc32(pack_level(self.level))
+        crc = zlib.crc32(repr(sorted(player.inventory.items())).encode(), crc)
+        return (self.frames, self.depth, player.x, player.y, player.hp, player.gold, crc)
+
+# --- Replays ---
+# A replay is a header (seed, world size, enemy AI mode and whether NumPy
+# moved the enemies, since each mode and backend draws different moves from
+# one seed), the
+# key stream as (key code, repeat count) runs with -1 for frames without a
+# key, and the digest of the final state so playback can check it ended
+# the same way.
+REPLAY_MAGIC = b"TQRP"
+REPLAY_VERSION = 2
+REPLAY_HEADER = struct.Struct("<4sBBqIIB")
+KEY_RUN = struct.Struct("<hH")
+FINAL_STATE = struct.Struct("<IHiiiiI")
+MAX_KEY_RUN = 0xFFFF
+
+class ReplayWriter:
+    def __init__(self, path, game):
+        self.file = open(path, "wb")
+        width, height = game.dungeon.world_size or (0, 0)
+        self.file.write(REPLAY_HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION, 1 if np is not None else 0, game.seed, width, height,
+            AI_MODES.index(game.ai),
+        ))
+        self.key = None
+        self.run = 0
+
+    def record(self, key):
+        if key == self.key and self.run < MAX_KEY_RUN:
+            self.run += 1
+            return
+        self.flush_run()
+        self.key = key
+        self.run = 1
+
+    def flush_run(self):
+        if self.run:
+            self.file.write(KEY_RUN.pack(self.key, self.run))
+            self.run = 0
+
+    def close(self, game):
+        self.flush_run()
+        self.file.write(FINAL_STATE.pack(*game.digest()))
+        self.file.close()
+
+class ReplayReader:
+    # ai, when given, is the mode the player asked for; a replay recorded in
+    # another mode is rejected rather than played back to a mismatch
+    def __init__(self, path, ai=None):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < REPLAY_HEADER.size + FINAL_STATE.size:
+            raise ValueError(f"{path}: not a TermiQuest replay")
+        magic, version, numpy_enemies, self.seed, width, height, ai_mode = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError(f"{path}: not a TermiQuest replay")
+        if version != REPLAY_VERSION:
+            raise ValueError(f"{path}: unsupported replay version {version}")
+        if bool(numpy_enemies) != (np is not None):
+            needed = "with" if numpy_enemies else "without"
+            raise ValueError(f"{path}: replay was recorded {needed} NumPy and can only be played back {needed} it")
+        if ai_mode >= len(AI_MODES):
+            raise ValueError(f"{path}: unknown enemy AI mode {ai_mode}")
+        self.ai = AI_MODES[ai_mode]
+        if ai is not None and ai != self.ai:
+            raise ValueError(f"{path}: replay was recorded with --ai {self.ai} and cannot be played back with --ai {ai}")
+        self.world_size = (width, height) if width else None
+        body_end = len(data) - FINAL_STATE.size
+        self.runs = list(KEY_RUN.iter_unpack(data[REPLAY_HEADER.size:body_end]))
+        self.final_state = FINAL_STATE.unpack_from(data, body_end)
+
+    def make_game(self, renderer=None, fog=False):
+        return Game(self.seed, self.world_size, fog, renderer, ai=self.ai)
+
+    def __iter__(self):
+        for key, run in self.runs:
+            for _ in range(run):
+                yield key
+
+def play_keys(game, keys):
+    # Feed a key stream through the game with no terminal and no waiting
+    for key in keys:
+        game.begin_frame()
+        if not game.handle(key):
             break
 
-        time.sleep(0.1)
+def run_replay(path, ai=None):
+    # Replay headless at full speed and compare the final state
+    replay = ReplayReader(path, ai)
+    game = replay.make_game()
+    start = time.perf_counter()
+    try:
+        play_keys(game, replay)
+    finally:
+        game.close()
+    elapsed = time.perf_counter() - start
+    final_state = game.digest()
+    return {
+        "frames": game.frames,
+        "depth": game.depth,
+        "hp": game.player.hp,
+        "gold": game.player.gold,
+        "matches": final_state == replay.final_state,
+        "expected": replay.final_state,
+        "actual": final_state,
+        "seconds": elapsed,
+        "frames_per_sec": game.frames / elapsed if elapsed else float("inf"),
+    }
+
+def main(stdscr, world_size=None, seed=None, show_stats=False, fog=False,
+         save_path=None, load_path=None, autosave=AUTOSAVE_TICKS, record=None, replay=None,
+         ai=ENEMY_AI):
+    # Returns the finished Game. A replay is fed from its key stream and
+    # shown as fast as the terminal allows
+    curses.curs_set(0)
+    stdscr.nodelay(True)
+    stdscr.timeout(0 if replay else 150)
+    init_colors()
+
+    renderer = MapRenderer(stdscr)
+    if replay:
+        game = replay.make_game(renderer, fog)
+        keys = iter(replay)
+    else:
+        game = Game(seed, world_size, fog, renderer, save_path, load_path, autosave, ai)
+        keys = None
+    recorder = ReplayWriter(record, game) if record else None
+    try:
+        while True:
+            if keys:
+                key = next(keys, None)
+                if key is None:
+                    break
+            game.begin_frame()
+
+            # Redraw only what changed; erase()/clear() would repaint everything
+            update_status(stdscr, game.player, game.depth, renderer if show_stats else None)
+            game.events.draw(stdscr)
+            renderer.draw(game.game_map, game.player, game.enemies, game.camera, game.fov)
+            curses.doupdate()
+
+            if not keys:
+                key = stdscr.getch()
+            elif stdscr.getch() == ord('q'):
+                break
+            if recorder:
+                recorder.record(key)
+            if not game.handle(key):
+                break
+            if not keys:
+                time.sleep(0.1)
+    finally:
+        if recorder:
+            recorder.close(game)
+        game.close()
+    return game
 
-curses.wrapper(main)
+def run_stress(enemy_count=STRESS_ENEMIES, ticks=STRESS_TICKS, size=STRESS_SIZE, seed=0, ai="chase"):
+    # Headless: a random walker on a big map with enemy_count enemies
+    # chasing it (or in another AI mode), timing the per-tick enemy work
+    # (field, moves, battle check)
+    random.seed(seed)
+    game_map = generate_map(*size, seed=seed)
+    for x, y in list(game_map.find_all(ENEMY_CHAR)):
+        game_map.set(x, y, FLOOR)
+    player = Player(size[0] // 2, size[1] // 2)
+    free = [cell for cell in game_map.find_all(FLOOR) if cell != (player.x, player.y)]
+    enemies = EnemyManager()
+    for x, y in random.sample(free, min(enemy_count, len(free))):
+        enemies.add(Enemy(x, y))
+    camera = Camera()
+    field = DistanceField()
+    times = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        player.move(*random.choice(STEPS), game_map)
+        camera.follow(player, game_map)
+        if ai != "wander":
+            field.update(game_map, player, 0)
+        enemies.tick(game_map, field, ai, camera.region(AI_RADIUS))
+        enemies.at(player.x, player.y)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    total = sum(times)
+    return {
+        "backend": "numpy" if np is not None else "python",
+        "ai": ai,
+        "enemies": len(enemies),
+        "ticks": ticks,
+        "seconds": total,
+        "ticks_per_sec": ticks / total,
+        "p50_ms": times[len(times) // 2] * 1000,
+        "p99_ms": times[min(len(times) - 1, len(times) * 99 // 100)] * 1000,
+        "max_ms": times[-1] * 1000,
+    }
+
+def print_stress(report):
+    print(f"backend:    {report['backend']}")
+    print(f"enemy AI:   {report['ai']}")
+    print(f"enemies:    {report['enemies']}")
+    print(f"ticks:      {report['ticks']}")
+    print(f"elapsed:    {report['seconds']:.3f} s")
+    print(f"ticks/sec:  {report['ticks_per_sec']:.0f}")
+    print(f"tick p50:   {report['p50_ms']:.2f} ms")
+    print(f"tick p99:   {report['p99_ms']:.2f} ms")
+    print(f"tick max:   {report['max_ms']:.2f} ms")
+
+def parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TermiQuest: a terminal dungeon crawler.")
+    parser.add_argument("--world", type=parse_size, metavar="WxH",
+                        help="make every level a large chunked world, e.g. 10000x10000")
+    parser.add_argument("--seed", type=int, help="seed for the dungeon's level generator")
+    parser.add_argument("--ai", choices=AI_MODES,
+                        help=f"enemy AI mode (default: {ENEMY_AI}; chase for --stress, the recorded mode for --replay)")
+    parser.add_argument("--stats", action="store_true", help="show cells and bytes drawn per frame")
+    parser.add_argument("--fog", action="store_true", help="fog of war: only draw what the player can see")
+    parser.add_argument("--bench-gen", type=parse_size, nargs="*", metavar="WxH",
+                        help="print maps generated per second at each size and exit")
+    parser.add_argument("--save", metavar="PATH",
+                        help="save to PATH on 's', on quit and every --autosave ticks")
+    parser.add_argument("--load", metavar="PATH", help="resume a saved game (saves go back to it)")
+    parser.add_argument("--autosave", type=int, default=AUTOSAVE_TICKS, metavar="TICKS",
+                        help="ticks between autosaves, 0 to disable")
+    parser.add_argument("--stress", type=int, nargs="?", const=STRESS_ENEMIES, metavar="ENEMIES",
+                        help=f"time enemy ticks headless with this many enemies (default {STRESS_ENEMIES}) and exit")
+    parser.add_argument("--record", metavar="PATH", help="record the seed and key stream as a replay")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="play a replay back at full speed and check its final state")
+    parser.add_argument("--no-render", action="store_true",
+                        help="run --replay without a terminal and report frames/sec")
+    args = parser.parse_args()
+    if args.record and args.load:
+        parser.error("--record starts a new game from its seed and cannot be combined with --load")
+    if args.replay:
+        if args.no_render:
+            report = run_replay(args.replay, args.ai)
+        else:
+            replay = ReplayReader(args.replay, args.ai)
+            game = curses.wrapper(main, fog=args.fog, show_stats=args.stats, replay=replay)
+            report = {"frames": game.frames, "depth": game.depth, "hp": game.player.hp,
+                      "gold": game.player.gold, "expected": replay.final_state,
+                      "actual": game.digest(), "matches": game.digest() == replay.final_state}
+        print(f"frames: {report['frames']}  depth: {report['depth'] + 1}  "
+              f"hp: {report['hp']}  gold: {report['gold']}")
+        if "frames_per_sec" in report:
+            print(f"{report['frames_per_sec']:.0f} frames/sec ({report['seconds']:.3f} s)")
+        if not report["matches"]:
+            print(f"final state mismatch: expected {report['expected']}, got {report['actual']}")
+            sys.exit(1)
+        print("final state matches the recording")
+    elif args.bench_gen is not None:
+        print_generation_benchmark(benchmark_generation(args.bench_gen or BENCH_SIZES))
+    elif args.stress:
+        print_stress(run_stress(args.stress, seed=args.seed or 0, ai=args.ai or "chase"))
+    else:
+        curses.wrapper(main, args.world, args.seed, args.stats, args.fog,
+                       args.save, args.load, args.autosave, args.record, ai=args.ai or ENEMY_AI)